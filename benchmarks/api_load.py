@@ -0,0 +1,269 @@
+"""End-to-end API load through the ASGI app, in-process over httpx.
+
+python benchmarks/api_load.py --datasets 1000 20000 --concurrency 1 8 32 \
+    --seconds 5 --output api_load.json --baseline previous.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+directory = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{directory.name}/bench.sqlite")
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+os.environ.setdefault("SLOW_QUERY_SECONDS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from database import engine  # noqa: E402
+from hashing import pwd_context  # noqa: E402
+from main import app  # noqa: E402
+
+PASSWORD = "benchmark"
+MECHANICS = 20
+COMPANIES = 50
+CARS_PER_COMPANY = 10
+ITEMS_PER_SERVICE = 3
+
+
+def seed_catalogue():
+    hashed_password = pwd_context.hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'INSERT INTO "user" (id, username, hashed_password, is_admin, '
+            "token_version) VALUES (?, ?, ?, 0, 0)",
+            [(i, f"mechanic{i}", hashed_password) for i in range(1, MECHANICS + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO company (id, name) VALUES (?, ?)",
+            [(i, f"company {i}") for i in range(1, COMPANIES + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO car (name, company) VALUES (?, ?)",
+            [
+                (f"car {company}-{i}", company)
+                for company in range(1, COMPANIES + 1)
+                for i in range(CARS_PER_COMPANY)
+            ],
+        )
+
+
+def seed_services(start: int, stop: int, rng: random.Random):
+    cars = COMPANIES * CARS_PER_COMPANY
+    first_day = date(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO service (id, mechanic, customer, date, total_price, car) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    i,
+                    rng.randint(1, MECHANICS),
+                    f"customer {i}",
+                    (first_day + timedelta(days=i % 1500)).isoformat(),
+                    ITEMS_PER_SERVICE * 10,
+                    rng.randint(1, cars),
+                )
+                for i in range(start + 1, stop + 1)
+            ],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO service_item (service, title, price) VALUES (?, ?, 10)",
+            [
+                (i, f"part {n}")
+                for i in range(start + 1, stop + 1)
+                for n in range(ITEMS_PER_SERVICE)
+            ],
+        )
+
+
+async def login(client, mechanic: int):
+    return await client.post(
+        "/user/login", json={"username": f"mechanic{mechanic}", "password": PASSWORD}
+    )
+
+
+async def auth_headers(client, mechanic: int) -> dict:
+    response = await login(client, mechanic)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def scenarios(tokens: dict, rng: random.Random) -> dict:
+    cars = COMPANIES * CARS_PER_COMPANY
+
+    async def login_scenario(client):
+        return [await login(client, rng.randint(1, MECHANICS))]
+
+    async def service_list(client):
+        headers = tokens[rng.randint(1, MECHANICS)]
+        return [await client.get("/service/", params={"limit": 50}, headers=headers)]
+
+    async def service_create(client):
+        headers = tokens[rng.randint(1, MECHANICS)]
+        service = await client.post(
+            "/service/",
+            json={"customer": "load", "car": rng.randint(1, cars)},
+            headers=headers,
+        )
+        if service.status_code != 200:
+            return [service]
+
+        items = [
+            {"service": service.json()["id"], "title": f"part {n}", "price": 10}
+            for n in range(ITEMS_PER_SERVICE)
+        ]
+        return [
+            service,
+            await client.post("/service/item/batch", json=items, headers=headers),
+        ]
+
+    async def catalogue_read(client):
+        headers = tokens[rng.randint(1, MECHANICS)]
+        return [
+            await client.get("/service/company", headers=headers),
+            await client.get("/service/car", headers=headers),
+            await client.get(f"/service/car/{rng.randint(1, cars)}", headers=headers),
+        ]
+
+    return {
+        "login": login_scenario,
+        "service_list": service_list,
+        "service_create": service_create,
+        "catalogue_read": catalogue_read,
+    }
+
+
+async def run_scenario(client, scenario, concurrency: int, seconds: float) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            responses = await scenario(client)
+            latencies.append(time.perf_counter() - start)
+            errors += sum(1 for r in responses if r.status_code >= 400)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "operations": len(latencies),
+        "errors": errors,
+        "ops_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+    }
+
+
+async def run(args) -> list[dict]:
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    seed_catalogue()
+    seeded = 0
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for size in sorted(args.datasets):
+            seed_services(seeded, size, rng)
+            seeded = size
+            tokens = {m: await auth_headers(client, m) for m in range(1, MECHANICS + 1)}
+
+            for name, scenario in scenarios(tokens, rng).items():
+                if args.scenarios and name not in args.scenarios:
+                    continue
+                for concurrency in args.concurrency:
+                    result = await run_scenario(
+                        client, scenario, concurrency, args.seconds
+                    )
+                    result = {
+                        "dataset": size,
+                        "scenario": name,
+                        "concurrency": concurrency,
+                        **result,
+                    }
+                    print(
+                        f"{size:>8} {name:>15} c={concurrency:<3} "
+                        f"{result['ops_per_second']:>8}/s "
+                        f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                        f"p99={result['p99_ms']}ms errors={result['errors']}"
+                    )
+                    results.append(result)
+
+            # service_create grows the table, seed the next size from its end
+            with engine.connect() as conn:
+                seeded = conn.exec_driver_sql("SELECT max(id) FROM service").scalar()
+
+    return results
+
+
+def compare(results: list[dict], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {
+            (r["dataset"], r["scenario"], r["concurrency"]): r
+            for r in json.load(f)["results"]
+        }
+
+    print("\nchange against", baseline_path)
+    for result in results:
+        before = baseline.get(
+            (result["dataset"], result["scenario"], result["concurrency"])
+        )
+        if before is None or not before["ops_per_second"] or not before["p95_ms"]:
+            continue
+        throughput = result["ops_per_second"] / before["ops_per_second"] - 1
+        p95 = result["p95_ms"] / before["p95_ms"] - 1
+        print(
+            f"{result['dataset']:>8} {result['scenario']:>15} "
+            f"c={result['concurrency']:<3} ops/s {throughput:+.1%} p95 {p95:+.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--datasets", type=int, nargs="+", default=[1000, 20000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--scenarios", nargs="*")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="api_load.json")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "database_url": os.environ["DATABASE_URL"],
+                "seconds": args.seconds,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("saved", args.output)
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Bytes on the wire vs. CPU for gzip and brotli on typical admin list payloads.
+
+python benchmarks/compression.py --bandwidth 1 10 --rounds 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import BrotliStream, GzipStream, brotli  # noqa: E402
+
+
+def service_page(size: int, rng: random.Random) -> dict:
+    services = []
+    for i in range(size):
+        items = [
+            {"title": rng.choice(["oil change", "brake pads", "tyre", "labour"]),
+             "price": rng.randint(5, 500)}
+            for _ in range(rng.randint(1, 5))
+        ]  # fmt: skip
+        services.append(
+            {
+                "customer": f"customer {rng.randint(1, 10_000)}",
+                "date": (date(2024, 1, 1) + timedelta(days=i % 365)).isoformat(),
+                "car": rng.randint(1, 500),
+                "id": 100_000 - i,
+                "total_price": sum(item["price"] for item in items),
+                "items": items,
+                "mechanic": rng.randint(1, 200),
+            }
+        )
+    return {"services": services, "next_cursor": "MjAyNC0wMS0wMXwxMjM0NQ"}
+
+
+def user_list(size: int, rng: random.Random) -> list:
+    return [
+        {"username": f"mechanic{i}", "is_admin": rng.random() < 0.05, "id": i}
+        for i in range(1, size + 1)
+    ]
+
+
+def car_list(size: int, rng: random.Random) -> list:
+    return [
+        {"name": f"model {i}", "id": i, "company": rng.randint(1, 60)}
+        for i in range(1, size + 1)
+    ]
+
+
+def payloads(rng: random.Random) -> dict[str, bytes]:
+    return {
+        "/admin/service limit=50": orjson.dumps(service_page(50, rng)),
+        "/admin/service limit=500": orjson.dumps(service_page(500, rng)),
+        "/admin/user 200 users": orjson.dumps(user_list(200, rng)),
+        "/admin/car 600 cars": orjson.dumps(car_list(600, rng)),
+    }
+
+
+def codecs() -> dict:
+    found = {f"gzip-{level}": (GzipStream, level) for level in (1, 6, 9)}
+    if brotli is not None:
+        found.update(
+            {f"br-{quality}": (BrotliStream, quality) for quality in (1, 4, 11)}
+        )
+    return found
+
+
+def measure(body: bytes, codec, setting, rounds: int) -> tuple[int, float]:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        size = len(codec(setting).compress(body, True))
+    return size, (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bandwidth", type=float, nargs="+", default=[1, 10])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli is not installed, only gzip is measured")
+
+    links = " ".join(f"{f'{mbit:g}Mbit/s':>11}" for mbit in args.bandwidth)
+    for name, body in payloads(random.Random(args.seed)).items():
+        print(f"\n{name}")
+        print(f"{'':>10} {'bytes':>9} {'ratio':>6} {'cpu ms':>8} {links}")
+        rows = [("identity", len(body), 0.0)] + [
+            (label, *measure(body, codec, setting, args.rounds))
+            for label, (codec, setting) in codecs().items()
+        ]
+        for label, size, seconds in rows:
+            # compression time plus transfer time at each link speed
+            totals = " ".join(
+                f"{(seconds + size * 8 / (mbit * 1e6)) * 1000:9.1f}ms"
+                for mbit in args.bandwidth
+            )
+            print(
+                f"{label:>10} {size:>9} {len(body) / size:>6.1f} "
+                f"{seconds * 1000:>8.2f} {totals}"
+            )
+
+
+if __name__ == "__main__":
+    main()
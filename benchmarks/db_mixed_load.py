@@ -0,0 +1,103 @@
+"""Mixed read/write throughput against SQLite, default vs. tuned pragmas.
+
+python benchmarks/db_mixed_load.py --workers 16 --seconds 10 --writes 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+
+import models.reports  # noqa: E402,F401
+import models.users  # noqa: E402,F401
+from crud.services import create_service_item, get_user_services  # noqa: E402
+from database import create_async_db_engine, create_db_engine  # noqa: E402
+from migrations import migrate  # noqa: E402
+from schemas.services import ServiceItemCreate  # noqa: E402
+from settings import SQLITE_PRAGMAS  # noqa: E402
+
+
+def seed(url: str, mechanics: int, services: int):
+    engine = create_db_engine(url, {})
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'INSERT INTO "user" (id, username, hashed_password, is_admin, '
+            "token_version) VALUES (?, ?, '', 0, 0)",
+            [(i, f"mechanic{i}") for i in range(1, mechanics + 1)],
+        )
+        conn.exec_driver_sql("INSERT INTO company (id, name) VALUES (1, 'c')")
+        conn.exec_driver_sql("INSERT INTO car (id, name, company) VALUES (1, 'c', 1)")
+        start = date(2020, 1, 1)
+        conn.exec_driver_sql(
+            "INSERT INTO service (mechanic, customer, date, total_price, car) "
+            "VALUES (?, ?, ?, 0, 1)",
+            [
+                (
+                    random.randint(1, mechanics),
+                    f"customer {i}",
+                    (start + timedelta(days=i % 1500)).isoformat(),
+                )
+                for i in range(services)
+            ],
+        )
+    engine.dispose()
+
+
+async def run(url: str, pragmas: dict, args) -> dict:
+    engine = create_async_db_engine(url, pragmas)
+    sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    deadline = time.perf_counter() + args.seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            mechanic = random.randint(1, args.mechanics)
+            async with sessions() as db:
+                try:
+                    if random.random() < args.writes:
+                        service = random.randint(1, args.services)
+                        item = ServiceItemCreate(service=service, title="x", price=1)
+                        await create_service_item(db, item)
+                        await db.commit()
+                        counts["writes"] += 1
+                    else:
+                        await get_user_services(db, mechanic, limit=50)
+                        counts["reads"] += 1
+                except OperationalError:
+                    counts["locked"] += 1
+
+    await asyncio.gather(*(worker() for _ in range(args.workers)))
+    await engine.dispose()
+    total = counts["reads"] + counts["writes"]
+    return {**counts, "ops_per_second": round(total / args.seconds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writes", type=float, default=0.2)
+    parser.add_argument("--mechanics", type=int, default=20)
+    parser.add_argument("--services", type=int, default=50_000)
+    args = parser.parse_args()
+
+    for label, pragmas in (("default", {}), ("tuned", SQLITE_PRAGMAS)):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.sqlite")
+            seed(f"sqlite:///{path}", args.mechanics, args.services)
+            result = asyncio.run(run(f"sqlite+aiosqlite:///{path}", pragmas, args))
+            print(f"{label:>8}: {result}")
+
+
+if __name__ == "__main__":
+    main()
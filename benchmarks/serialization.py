@@ -0,0 +1,110 @@
+"""Service page payloads: ORM objects through the response_model vs. plain rows.
+
+python benchmarks/serialization.py --services 20000 --limit 500 --rounds 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+directory = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{directory.name}/bench.sqlite")
+os.environ.setdefault("SLOW_QUERY_SECONDS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+import models.reports  # noqa: E402,F401
+import models.users  # noqa: E402,F401
+from crud.services import paginate_services  # noqa: E402
+from database import AsyncSessionLocal, engine  # noqa: E402
+from migrations import migrate  # noqa: E402
+from models.services import Service  # noqa: E402
+from responses import FastJSONResponse  # noqa: E402
+from schemas.services import ServicePage  # noqa: E402
+
+page_adapter = TypeAdapter(ServicePage)
+
+
+def seed(services: int):
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'INSERT INTO "user" (id, username, hashed_password, is_admin, '
+            "token_version) VALUES (1, 'mechanic', '', 0, 0)"
+        )
+        conn.exec_driver_sql("INSERT INTO company (id, name) VALUES (1, 'c')")
+        conn.exec_driver_sql("INSERT INTO car (id, name, company) VALUES (1, 'c', 1)")
+        conn.exec_driver_sql(
+            "INSERT INTO service (id, mechanic, customer, date, total_price, car) "
+            "VALUES (?, 1, ?, '2024-01-01', 30, 1)",
+            [(i, f"customer {i}") for i in range(1, services + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO service_item (service, title, price) VALUES (?, ?, 10)",
+            [(i, f"part {n}") for i in range(1, services + 1) for n in range(3)],
+        )
+
+
+async def orm_page(limit: int) -> bytes:
+    # what the list endpoints did before: ORM objects with their items,
+    # validated and encoded through the response_model
+    async with AsyncSessionLocal() as db:
+        query = (
+            select(Service)
+            .options(selectinload(Service.items))
+            .order_by(Service.date.desc(), Service.id.desc())
+            .limit(limit)
+        )
+        services = (await db.scalars(query)).all()
+        page = page_adapter.validate_python(
+            {"services": services, "next_cursor": None}, from_attributes=True
+        )
+        return page_adapter.dump_json(page)
+
+
+async def row_page(limit: int) -> bytes:
+    async with AsyncSessionLocal() as db:
+        services, _ = await paginate_services(db, select(Service), limit)
+        return FastJSONResponse({"services": services, "next_cursor": None}).body
+
+
+async def timed(page, limit: int, rounds: int) -> float:
+    await page(limit)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await page(limit)
+    return (time.perf_counter() - start) / rounds
+
+
+async def run(args):
+    orm, rows = await orm_page(args.limit), await row_page(args.limit)
+    assert json.loads(orm) == json.loads(rows), "payloads differ"
+
+    before = await timed(orm_page, args.limit, args.rounds)
+    after = await timed(row_page, args.limit, args.rounds)
+    print(f"page of {args.limit} services, {len(rows)} bytes")
+    print(f"  orm + response_model:        {before * 1000:8.2f} ms")
+    print(f"  rows + orjson:               {after * 1000:8.2f} ms")
+    print(f"  speedup:                     {before / after:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--services", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.services)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
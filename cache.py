@@ -0,0 +1,86 @@
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from time import monotonic
+
+import orjson
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from settings import CATALOGUE_CACHE_SIZE, CATALOGUE_CACHE_TTL
+
+
+@lru_cache
+def type_adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[str, bytes, float]] = OrderedDict()
+
+    def get(self, key: tuple) -> tuple[str, bytes] | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[2] < monotonic():
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, key: tuple, body: bytes, generation: int) -> tuple[str, bytes]:
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+        # a write that happened while the body was loaded makes it stale
+        if generation == self.generation:
+            self._entries[key] = (etag, body, monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return etag, body
+
+    def invalidate(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    async def respond(self, request: Request, key: tuple, schema, load) -> Response:
+        entry = self.get(key)
+        if entry is None:
+            generation = self.generation
+            if schema is None:
+                # load already returns plain data in the response's shape
+                body = orjson.dumps(await load())
+            else:
+                adapter = type_adapter(schema)
+                data = adapter.validate_python(await load(), from_attributes=True)
+                body = adapter.dump_json(data)
+            entry = self.put(key, body, generation)
+
+        etag, body = entry
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        return Response(body, media_type="application/json", headers=headers)
+
+
+catalogue_cache = ResponseCache(CATALOGUE_CACHE_SIZE, CATALOGUE_CACHE_TTL)
@@ -0,0 +1,157 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from settings import (
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MINIMUM_SIZE,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+)
+
+
+class GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # a sync flush hands every streamed chunk to the client right away
+        mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(mode)
+
+
+class BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        data = self._compressor.process(data)
+        return data + (self._compressor.finish() if final else self._compressor.flush())
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        try:
+            weight = float(params.strip().removeprefix("q=")) if params else 1.0
+        except ValueError:
+            weight = 0.0
+        weights[coding.strip()] = weight
+
+    for coding in ("br", "gzip") if brotli else ("gzip",):
+        if weights.get(coding, weights.get("*", 0)) > 0:
+            return coding
+
+    return None
+
+
+def compressible(status: int, headers: Headers) -> bool:
+    if status in (204, 304) or "content-encoding" in headers:
+        return False
+
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+
+def weaken_etag(headers: MutableHeaders):
+    # the encoded body is a different representation of the resource
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def stream(self, coding: str):
+        if coding == "br":
+            return BrotliStream(self.brotli_quality)
+
+        return GzipStream(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        stream = None
+        buffered = []
+
+        async def send_wrapper(message):
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                # held back until the body shows whether compression pays off
+                start = message
+                return
+
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is None:
+                if stream is not None:
+                    message = {**message, "body": stream.compress(body, not more_body)}
+                return await send(message)
+
+            headers = MutableHeaders(raw=start["headers"])
+            if start["status"] == 304:
+                # revalidations answer for the compressed 200
+                headers.add_vary_header("Accept-Encoding")
+                weaken_etag(headers)
+            if not compressible(start["status"], headers):
+                await send(start)
+                start = None
+                return await send(message)
+
+            # sized responses are compressed in one piece, streams as soon as
+            # they have produced enough to be worth compressing
+            buffered.append(body)
+            size = sum(len(chunk) for chunk in buffered)
+            if more_body and ("content-length" in headers or size < self.minimum_size):
+                return
+
+            body = b"".join(buffered)
+            headers.add_vary_header("Accept-Encoding")
+            if size >= self.minimum_size:
+                stream = self.stream(coding)
+                body = stream.compress(body, not more_body)
+                headers["Content-Encoding"] = coding
+                weaken_etag(headers)
+                if not more_body:
+                    headers["Content-Length"] = str(len(body))
+
+            await send(start)
+            start = None
+            await send(
+                {"type": "http.response.body", "body": body, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,10 +1,19 @@
+import asyncio
+
 from crud.users import create_user
-from database import SessionLocal
+from database import AsyncSessionLocal
 from schemas.users import UserCreate
 
+
+async def main(user: UserCreate):
+    async with AsyncSessionLocal() as db:
+        await create_user(db, user, True)
+        await db.commit()
+
+
 print("\nyou are creating admin user\n")
 user = UserCreate(
     username=input("enter username : "), password=input("enter password : ")
 )
 
-create_user(SessionLocal(), user, True)
+asyncio.run(main(user))
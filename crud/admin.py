@@ -1,15 +1,26 @@
 from datetime import date
 
-from sqlalchemy.orm import Session
-
+from sqlalchemy import Select, delete, exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.reports import rebuild_revenue
+from crud.search import contains
+from crud.services import SERVICE_LIST_FIELDS, paginate_services
+from crud.users import remember_token_version
+from database import on_commit
+from models.reports import RevenueDaily
 from models.services import Car, Company, Service, ServiceItem
 from models.users import User
 from schemas.admin import CarUpdate, CompanyUpdate, UserUpdate
 from schemas.services import CarCreate, CompanyCreate
 
+ADMIN_SERVICE_FIELDS = [*SERVICE_LIST_FIELDS, "mechanic"]
+
 
-def get_users(db: Session, is_admin: bool = None, username: str = None) -> list[User]:
-    query = db.query(User)
+async def get_users(
+    db: AsyncSession, is_admin: bool = None, username: str = None
+) -> list[dict]:
+    query = select(User.username, User.is_admin, User.id)
 
     if is_admin is not None:
         query = query.filter(User.is_admin == is_admin)
@@ -17,85 +28,83 @@ def get_users(db: Session, is_admin: bool = None, username: str = None) -> list[
     if username is not None:
         query = query.filter(User.username.contains(username))
 
-    return query.all()
+    return [row._asdict() for row in await db.execute(query)]
 
 
-def get_user_by_id(db: Session, user_id: int) -> User:
-    return db.query(User).get(user_id)
+async def get_user_by_id(db: AsyncSession, user_id: int) -> User:
+    return await db.get(User, user_id)
 
 
-def delete_user(db: Session, user: User) -> User:
-    db.delete(user)
-    db.commit()
+async def delete_user(db: AsyncSession, user: User) -> User:
+    await db.delete(user)
+    await db.flush()
+    on_commit(db, lambda: remember_token_version(user.id, None))
     return user
 
 
-def update_user(db: Session, user: User, user_new: UserUpdate) -> User:
+async def update_user(db: AsyncSession, user: User, user_new: UserUpdate) -> User:
     user.username = user_new.username
     user.is_admin = user_new.is_admin
-    db.commit()
+    user.token_version += 1
+    await db.flush()
+    on_commit(db, lambda: remember_token_version(user.id, user.token_version))
     return user
 
 
-def create_company(db: Session, data: CompanyCreate) -> Company:
+async def create_company(db: AsyncSession, data: CompanyCreate) -> Company:
     company = Company(name=data.name)
     db.add(company)
-    db.commit()
-    db.refresh(company)
+    await db.flush()
     return company
 
 
-def delete_company(db: Session, company: Company) -> Company:
-    db.query(Car).filter(Car.company == company.id).delete()
-    db.delete(company)
-    db.commit()
+async def delete_company(db: AsyncSession, company: Company) -> Company:
+    await db.delete(company)
+    await db.flush()
     return company
 
 
-def create_car(db: Session, data: CarCreate) -> Car:
+async def create_car(db: AsyncSession, data: CarCreate) -> Car:
     car = Car(name=data.name, company=data.company)
     db.add(car)
-    db.commit()
-    db.refresh(car)
+    await db.flush()
     return car
 
 
-def delete_car(db: Session, car: Car) -> Car:
-    db.delete(car)
-    db.commit()
+async def delete_car(db: AsyncSession, car: Car) -> Car:
+    await db.delete(car)
+    await db.flush()
     return car
 
 
-def update_car(db: Session, car: Car, data: CarUpdate):
+async def update_car(db: AsyncSession, car: Car, data: CarUpdate):
     car.name = data.name
     car.company = data.company
-    db.commit()
+    await db.flush()
     return car
 
 
-def update_company(db: Session, company: Company, data: CompanyUpdate):
+async def update_company(db: AsyncSession, company: Company, data: CompanyUpdate):
     company.name = data.name
-    db.commit()
+    await db.flush()
     return company
 
 
-def check_unique_car(db: Session, company: Company, name: str):
-    return (
-        db.query(Car).filter(Car.company == company.id).filter(Car.name == name).all()
-    )
+async def check_unique_car(db: AsyncSession, company: Company, name: str):
+    query = select(Car).filter(Car.company == company.id).filter(Car.name == name)
+    return (await db.scalars(query)).all()
 
 
-def get_services(
-    db: Session,
+def services_query(
     customer: str = None,
     mechanic: int = None,
     start_date: date = None,
     end_date: date = None,
-) -> list[Service]:
-    query = db.query(Service)
+) -> Select:
+    query = select(Service)
 
     if customer is not None:
-        query = query.filter(Service.customer.icontains(customer))
+        query = query.filter(contains(Service.customer, customer))
 
     if mechanic is not None:
         query = query.filter(Service.mechanic == mechanic)
@@ -107,3 +116,64 @@ def get_services(
         query = query.filter(Service.date < end_date)
 
     return query
+
+
+async def get_services(
+    db: AsyncSession,
+    customer: str = None,
+    mechanic: int = None,
+    start_date: date = None,
+    end_date: date = None,
+    limit: int = 50,
+    cursor: tuple[date, int] = None,
+    fields: list[str] = ADMIN_SERVICE_FIELDS,
+) -> tuple[list[dict], str | None]:
+    query = services_query(customer, mechanic, start_date, end_date)
+    return await paginate_services(db, query, limit, cursor, fields)
+
+
+async def recompute_service_totals(db: AsyncSession) -> int:
+    totals = (
+        select(ServiceItem.service, func.sum(ServiceItem.price).label("total"))
+        .group_by(ServiceItem.service)
+        .subquery()
+    )
+    cleared = await db.execute(
+        update(Service)
+        .filter(Service.total_price != 0)
+        .filter(~exists().where(ServiceItem.service == Service.id))
+        .values(total_price=0)
+        .execution_options(synchronize_session=False)
+    )
+    summed = await db.execute(
+        update(Service)
+        .filter(Service.id == totals.c.service)
+        .values(total_price=totals.c.total)
+        .execution_options(synchronize_session=False)
+    )
+    await rebuild_revenue(db)
+    await db.flush()
+    return cleared.rowcount + summed.rowcount
+
+
+async def get_service_days(db: AsyncSession, before: date) -> list[date]:
+    query = (
+        select(Service.date)
+        .filter(Service.date < before)
+        .distinct()
+        .order_by(Service.date)
+    )
+    return (await db.scalars(query)).all()
+
+
+async def purge_service_day(db: AsyncSession, day: date) -> int:
+    # the whole day goes at once so its rollup rows can simply be dropped,
+    # items follow their services through ON DELETE CASCADE
+    await db.execute(delete(RevenueDaily).filter(RevenueDaily.day == day))
+    deleted = await db.execute(
+        delete(Service)
+        .filter(Service.date == day)
+        .execution_options(synchronize_session=False)
+    )
+    await db.flush()
+    return deleted.rowcount
@@ -0,0 +1,121 @@
+import csv
+import json
+from typing import AsyncIterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert
+from models.services import Car, Company
+from schemas.admin import CatalogueImportResult
+
+MAX_REPORTED_ERRORS = 20
+
+
+def _insert_ignore(db: AsyncSession, model, index_elements: list[str]):
+    return (
+        dialect_insert(db, model)
+        .on_conflict_do_nothing(index_elements=index_elements)
+        .returning(model.id)
+    )
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def parse_csv_line(line: str) -> tuple[str, str]:
+    company, car = next(csv.reader([line]))
+    return company, car
+
+
+def parse_ndjson_line(line: str) -> tuple[str, str]:
+    row = json.loads(line)
+    return row["company"], row["car"]
+
+
+async def iter_catalogue_rows(
+    chunks: AsyncIterator[bytes], file_format: str, result: CatalogueImportResult
+) -> AsyncIterator[tuple[str, str]]:
+    parse = parse_ndjson_line if file_format == "ndjson" else parse_csv_line
+    line_no = 0
+
+    async for raw in iter_lines(chunks):
+        line_no += 1
+        line = raw.decode("utf-8", errors="replace").strip()
+        if not line:
+            continue
+
+        try:
+            company, car = (str(value).strip() for value in parse(line))
+        except (ValueError, KeyError, TypeError):
+            company = car = ""
+
+        if file_format == "csv" and line_no == 1 and company.lower() == "company":
+            continue
+
+        if company and car:
+            yield company, car
+            continue
+
+        result.invalid += 1
+        if len(result.errors) < MAX_REPORTED_ERRORS:
+            result.errors.append(f"line {line_no}: expected a company and a car name")
+
+
+async def import_catalogue_chunk(
+    db: AsyncSession, rows: list[tuple[str, str]], result: CatalogueImportResult
+):
+    names = {company for company, _ in rows}
+    created = await db.scalars(
+        _insert_ignore(db, Company, ["name"]).values([{"name": n} for n in names])
+    )
+    result.companies_created += len(created.all())
+
+    companies = dict(
+        (
+            await db.execute(
+                select(Company.name, Company.id).filter(Company.name.in_(names))
+            )
+        )
+        .tuples()
+        .all()
+    )
+    cars = {(name, companies[company]) for company, name in rows}
+    inserted = await db.scalars(
+        _insert_ignore(db, Car, ["name", "company"]).values(
+            [{"name": name, "company": company} for name, company in cars]
+        )
+    )
+    inserted = len(inserted.all())
+    result.inserted += inserted
+    result.skipped += len(rows) - inserted
+    await db.commit()
+
+
+async def import_catalogue(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    file_format: str = "csv",
+    chunk_size: int = 500,
+) -> CatalogueImportResult:
+    result = CatalogueImportResult()
+    rows = []
+
+    async for row in iter_catalogue_rows(chunks, file_format, result):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            await import_catalogue_chunk(db, rows, result)
+            rows = []
+
+    if rows:
+        await import_catalogue_chunk(db, rows, result)
+
+    return result
@@ -0,0 +1,134 @@
+import asyncio
+import csv
+import io
+import json
+from contextlib import aclosing
+from typing import AsyncIterator, Callable
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from models.services import Service
+
+SERVICE_FIELDS = ["id", "date", "customer", "mechanic", "car", "total_price"]
+ITEM_FIELDS = ["item_id", "item_title", "item_price"]
+
+
+def service_row(service: Service) -> dict:
+    return {
+        "id": service.id,
+        "date": service.date.isoformat(),
+        "customer": service.customer,
+        "mechanic": service.mechanic,
+        "car": service.car,
+        "total_price": int(service.total_price or 0),
+    }
+
+
+def item_rows(service: Service) -> list[dict]:
+    return [
+        {"id": item.id, "title": item.title, "price": int(item.price)}
+        for item in service.items
+    ]
+
+
+def flat_rows(service: Service) -> list[dict]:
+    row = service_row(service)
+    items = item_rows(service)
+    if not items:
+        return [{**row, "item_id": None, "item_title": None, "item_price": None}]
+
+    return [
+        {
+            **row,
+            "item_id": item["id"],
+            "item_title": item["title"],
+            "item_price": item["price"],
+        }
+        for item in items
+    ]
+
+
+def nested_row(service: Service) -> dict:
+    return {**service_row(service), "items": item_rows(service)}
+
+
+def format_ndjson(services: list[Service], nested: bool) -> str:
+    if nested:
+        rows = [nested_row(service) for service in services]
+    else:
+        rows = [row for service in services for row in flat_rows(service)]
+
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+def format_csv(services: list[Service], nested: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for service in services:
+        if nested:
+            row = nested_row(service)
+            writer.writerow(
+                [row[field] for field in SERVICE_FIELDS] + [json.dumps(row["items"])]
+            )
+        else:
+            for row in flat_rows(service):
+                writer.writerow([row[field] for field in SERVICE_FIELDS + ITEM_FIELDS])
+
+    return buffer.getvalue()
+
+
+def csv_header(nested: bool) -> str:
+    fields = SERVICE_FIELDS + (["items"] if nested else ITEM_FIELDS)
+    return ",".join(fields) + "\r\n"
+
+
+async def count_services(db: AsyncSession, query: Select) -> int:
+    return await db.scalar(select(func.count()).select_from(query.subquery()))
+
+
+async def next_partition(partitions: AsyncIterator[list]) -> list | None:
+    # a cancel landing inside the driver call makes sqlalchemy close cursors
+    # on a connection that is going away. the batch in flight is fetched to
+    # the end and the cancel goes through after it
+    fetch = asyncio.ensure_future(anext(partitions, None))
+    try:
+        return await asyncio.shield(fetch)
+    except asyncio.CancelledError:
+        await asyncio.wait([fetch])
+        raise
+
+
+async def export_services(
+    db: AsyncSession,
+    query: Select,
+    file_format: str = "csv",
+    nested: bool = False,
+    batch_size: int = 1000,
+    progress: Callable[[int], None] = None,
+) -> AsyncIterator[str]:
+    query = (
+        query.options(selectinload(Service.items))
+        .order_by(Service.date, Service.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream_scalars(query)
+
+    # closed here rather than left to the session, so a cancelled export
+    # does not leave the cursor open under a connection being torn down
+    try:
+        if file_format == "csv":
+            yield csv_header(nested)
+
+        async with aclosing(result.partitions()) as partitions:
+            while (services := await next_partition(partitions)) is not None:
+                if file_format == "csv":
+                    yield format_csv(services, nested)
+                else:
+                    yield format_ndjson(services, nested)
+
+                if progress is not None:
+                    progress(len(services))
+    finally:
+        await result.close()
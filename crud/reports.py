@@ -0,0 +1,142 @@
+from datetime import date
+
+from sqlalchemy import String, cast, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert
+from models.reports import RevenueDaily
+from models.services import Service
+
+BUCKET_KEYS = ["day", "mechanic", "car"]
+
+
+async def add_unassigned_revenue(
+    db: AsyncSession, day: date, car: int, revenue, services: int
+):
+    # deleting mechanics detaches their buckets without merging them, a day
+    # and car can hold several without a mechanic. they are merged here
+    bucket = (
+        RevenueDaily.day == day,
+        RevenueDaily.mechanic.is_(None),
+        RevenueDaily.car == car,
+    )
+    totals = await db.execute(
+        select(
+            func.coalesce(func.sum(RevenueDaily.revenue), 0),
+            func.coalesce(func.sum(RevenueDaily.services), 0),
+        ).filter(*bucket)
+    )
+    old_revenue, old_services = totals.one()
+    await db.execute(delete(RevenueDaily).filter(*bucket))
+
+    # a bucket left without services is dropped, as rebuild_revenue would
+    if old_services + services > 0:
+        await db.execute(
+            insert(RevenueDaily).values(
+                day=day,
+                mechanic=None,
+                car=car,
+                revenue=old_revenue + revenue,
+                services=old_services + services,
+            )
+        )
+
+
+async def add_revenue(
+    db: AsyncSession,
+    day: date,
+    mechanic: int | None,
+    car: int,
+    revenue=0,
+    services: int = 0,
+):
+    # like rebuild_revenue, services without a day or car are not rolled up
+    if (not revenue and not services) or None in (day, car):
+        return
+
+    if mechanic is None:
+        await add_unassigned_revenue(db, day, car, revenue, services)
+        return
+
+    stmt = dialect_insert(db, RevenueDaily).values(
+        day=day, mechanic=mechanic, car=car, revenue=revenue, services=services
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=BUCKET_KEYS,
+        set_={
+            "revenue": RevenueDaily.revenue + stmt.excluded.revenue,
+            "services": RevenueDaily.services + stmt.excluded.services,
+        },
+    )
+    await db.execute(stmt)
+
+    if services < 0:
+        # a bucket left without services is dropped, as rebuild_revenue would
+        await db.execute(
+            delete(RevenueDaily)
+            .filter(RevenueDaily.day == day)
+            .filter(RevenueDaily.mechanic == mechanic)
+            .filter(RevenueDaily.car == car)
+            .filter(RevenueDaily.services <= 0)
+        )
+
+
+async def rebuild_revenue(db: AsyncSession):
+    await db.execute(delete(RevenueDaily))
+    buckets = (
+        select(
+            Service.date,
+            Service.mechanic,
+            Service.car,
+            func.coalesce(func.sum(Service.total_price), 0),
+            func.count(),
+        )
+        .filter(Service.date.is_not(None))
+        .filter(Service.car.is_not(None))
+        .group_by(Service.date, Service.mechanic, Service.car)
+    )
+    await db.execute(
+        insert(RevenueDaily).from_select(BUCKET_KEYS + ["revenue", "services"], buckets)
+    )
+
+
+REPORT_GROUPS = {
+    "day": RevenueDaily.day,
+    "month": func.substr(cast(RevenueDaily.day, String), 1, 7),
+    "mechanic": RevenueDaily.mechanic,
+    "car": RevenueDaily.car,
+}
+
+
+async def revenue_report(
+    db: AsyncSession,
+    group_by: str,
+    start_date: date = None,
+    end_date: date = None,
+    mechanic: int = None,
+    car: int = None,
+) -> list[dict]:
+    key = REPORT_GROUPS[group_by]
+    query = select(
+        key.label("key"),
+        func.sum(RevenueDaily.revenue).label("revenue"),
+        func.sum(RevenueDaily.services).label("services"),
+    )
+
+    if start_date is not None:
+        query = query.filter(RevenueDaily.day >= start_date)
+
+    if end_date is not None:
+        query = query.filter(RevenueDaily.day <= end_date)
+
+    if mechanic is not None:
+        query = query.filter(RevenueDaily.mechanic == mechanic)
+
+    if car is not None:
+        query = query.filter(RevenueDaily.car == car)
+
+    rows = await db.execute(query.group_by(key).order_by(key))
+    return [
+        {"key": row.key, "revenue": int(row.revenue or 0), "services": row.services}
+        for row in rows
+    ]
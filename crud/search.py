@@ -0,0 +1,119 @@
+from sqlalchemy import column, func, or_, select, table, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute, selectinload
+
+from database import engine
+from models.services import Car, Company, Service, ServiceItem
+
+# fts5 table -> (content table, indexed column); the trigram tokenizer
+# indexes every 3 character substring, so MATCH answers the same questions
+# as LIKE '%term%' for terms of 3 or more characters
+FTS_TABLES = {
+    "service_fts": ("service", "customer"),
+    "service_item_fts": ("service_item", "title"),
+    "car_fts": ("car", "name"),
+    "company_fts": ("company", "name"),
+}
+FTS_ENABLED = engine.dialect.name == "sqlite"
+MIN_TERM_LENGTH = 3
+
+
+def fts_table(model) -> table:
+    name = f"{model.__tablename__}_fts"
+    _, indexed = FTS_TABLES[name]
+    return table(name, column("rowid"), column(indexed), column("rank"))
+
+
+def use_fts(term: str) -> bool:
+    return FTS_ENABLED and len(term) >= MIN_TERM_LENGTH
+
+
+def fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def fts_matches(attribute: InstrumentedAttribute, term: str):
+    fts = fts_table(attribute.class_)
+    return select(fts.c.rowid.label("id"), fts.c.rank.label("rank")).where(
+        fts.c[attribute.key].match(fts_phrase(term))
+    )
+
+
+def contains(attribute: InstrumentedAttribute, term: str):
+    if not use_fts(term):
+        return attribute.icontains(term)
+
+    matches = fts_matches(attribute, term).subquery()
+    return attribute.class_.id.in_(select(matches.c.id))
+
+
+def best_rank(*matches):
+    matches = union_all(*matches).subquery()
+    return (
+        select(matches.c.id, func.min(matches.c.rank).label("rank"))
+        .group_by(matches.c.id)
+        .subquery()
+    )
+
+
+async def search_services(
+    db: AsyncSession, term: str, mechanic: int = None, limit: int = 20
+) -> list[Service]:
+    query = select(Service).options(selectinload(Service.items))
+
+    if use_fts(term):
+        items = fts_matches(ServiceItem.title, term).subquery()
+        ranked = best_rank(
+            fts_matches(Service.customer, term),
+            select(ServiceItem.service, items.c.rank).join(
+                items, items.c.id == ServiceItem.id
+            ),
+        )
+        query = query.join(ranked, ranked.c.id == Service.id).order_by(ranked.c.rank)
+    else:
+        item_match = select(ServiceItem.service).filter(
+            ServiceItem.title.icontains(term)
+        )
+        query = query.filter(
+            or_(Service.customer.icontains(term), Service.id.in_(item_match))
+        ).order_by(Service.date.desc(), Service.id.desc())
+
+    if mechanic is not None:
+        query = query.filter(Service.mechanic == mechanic)
+
+    return (await db.scalars(query.limit(limit))).all()
+
+
+async def search_cars(db: AsyncSession, term: str, limit: int = 20) -> list[Car]:
+    query = select(Car)
+
+    if use_fts(term):
+        companies = fts_matches(Company.name, term).subquery()
+        ranked = best_rank(
+            fts_matches(Car.name, term),
+            select(Car.id, companies.c.rank).join(
+                companies, companies.c.id == Car.company
+            ),
+        )
+        query = query.join(ranked, ranked.c.id == Car.id).order_by(ranked.c.rank)
+    else:
+        company_match = select(Company.id).filter(Company.name.icontains(term))
+        query = query.filter(
+            or_(Car.name.icontains(term), Car.company.in_(company_match))
+        ).order_by(Car.name)
+
+    return (await db.scalars(query.limit(limit))).all()
+
+
+async def search_companies(
+    db: AsyncSession, term: str, limit: int = 20
+) -> list[Company]:
+    query = select(Company)
+
+    if use_fts(term):
+        ranked = fts_matches(Company.name, term).subquery()
+        query = query.join(ranked, ranked.c.id == Company.id).order_by(ranked.c.rank)
+    else:
+        query = query.filter(Company.name.icontains(term)).order_by(Company.name)
+
+    return (await db.scalars(query.limit(limit))).all()
@@ -1,7 +1,11 @@
 from datetime import date
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Integer, Select, cast, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
+from crud.reports import add_revenue
+from crud.search import contains
 from models.services import Car, Company, Service, ServiceItem
 from schemas.services import (
     CompanyCreate,
@@ -10,83 +14,156 @@ from schemas.services import (
     ServiceItemUpdate,
     ServiceUpdate,
 )
+from utils import encode_cursor
 
+# ServiceInDB as plain columns, list endpoints build their payload from rows
+SERVICE_COLUMNS = {
+    "customer": Service.customer,
+    "date": Service.date,
+    "car": Service.car,
+    "id": Service.id,
+    "total_price": cast(Service.total_price, Integer).label("total_price"),
+    "mechanic": Service.mechanic,
+}
+SERVICE_LIST_FIELDS = ["customer", "date", "car", "id", "total_price", "items"]
 
-def get_companies(db: Session, name: str = None) -> list[Company]:
-    query = db.query(Company)
+
+async def get_companies(db: AsyncSession, name: str = None) -> list[Company]:
+    query = select(Company)
 
     if name is not None:
-        query = query.filter(Company.name.contains(name))
+        query = query.filter(contains(Company.name, name))
 
-    return query.all()
+    return (await db.scalars(query)).all()
 
 
-def create_company(db: Session, data: CompanyCreate) -> Company:
+async def create_company(db: AsyncSession, data: CompanyCreate) -> Company:
     company = Company(name=data.name)
     db.add(company)
-    db.commit()
-    db.refresh(company)
+    await db.flush()
     return company
 
 
-def get_company_by_id(db: Session, company_id: int) -> Company:
-    return db.query(Company).get(company_id)
+async def get_company_by_id(
+    db: AsyncSession, company_id: int, with_cars: bool = True
+) -> Company:
+    # loaded cars would be deleted one by one by the orm instead of by the
+    # ON DELETE CASCADE of the company row
+    options = [selectinload(Company.cars)] if with_cars else []
+    return await db.get(Company, company_id, options=options)
 
 
-def get_company_by_name(db: Session, name: str) -> Company:
-    return db.query(Company).filter(Company.name == name).first()
+async def get_company_by_name(db: AsyncSession, name: str) -> Company:
+    return await db.scalar(select(Company).filter(Company.name == name).limit(1))
 
 
-def get_cars(db: Session, name: str = None) -> list[Car]:
-    query = db.query(Car)
+async def get_cars(db: AsyncSession, name: str = None) -> list[dict]:
+    query = select(Car.name, Car.id, Car.company)
 
     if name is not None:
-        query = query.filter(Car.name.icontains(name))
-
-    return query.all()
-
+        query = query.filter(contains(Car.name, name))
 
-def get_car_by_id(db: Session, car_id: int) -> Car:
-    return db.query(Car).get(car_id)
+    return [row._asdict() for row in await db.execute(query)]
 
 
-def update_service_price(db: Session, service: Service) -> Service:
-    s = 0
-    items = service.items
+async def get_car_by_id(db: AsyncSession, car_id: int) -> Car:
+    return await db.get(Car, car_id)
 
-    for item in items:
-        s += item.price
 
-    service.total_price = s
-    db.commit()
+async def update_service_price(db: AsyncSession, service_id: int, delta) -> None:
+    bucket = await db.execute(
+        update(Service)
+        .filter(Service.id == service_id)
+        .values(total_price=Service.total_price + delta)
+        .returning(Service.date, Service.mechanic, Service.car)
+    )
+    bucket = bucket.one_or_none()
+    if bucket is not None:
+        await add_revenue(db, *bucket, revenue=delta)
 
 
-def create_service(db: Session, user_id: int, data: ServiceCreate) -> Service:
+async def create_service(
+    db: AsyncSession, user_id: int, data: ServiceCreate
+) -> Service:
     service = Service(
         mechanic=user_id,
         customer=data.customer,
         date=data.date,
         car=data.car,
         total_price=0,
+        items=[],
     )
 
     db.add(service)
-    db.commit()
-    db.refresh(service)
+    await add_revenue(db, data.date, user_id, data.car, services=1)
+    await db.flush()
     return service
 
 
-def get_user_services(
-    db: Session,
+async def attach_items(db: AsyncSession, services: list[dict], ids: list[int]):
+    items = {service_id: [] for service_id in ids}
+
+    if items:
+        rows = await db.execute(
+            select(
+                ServiceItem.service,
+                ServiceItem.title,
+                cast(ServiceItem.price, Integer).label("price"),
+            )
+            .filter(ServiceItem.service.in_(items))
+            .order_by(ServiceItem.id)
+        )
+        for service_id, title, price in rows:
+            items[service_id].append({"title": title, "price": price})
+
+    for service, service_id in zip(services, ids):
+        service["items"] = items[service_id]
+
+
+async def paginate_services(
+    db: AsyncSession,
+    query: Select,
+    limit: int,
+    cursor: tuple[date, int] = None,
+    fields: list[str] = SERVICE_LIST_FIELDS,
+) -> tuple[list[dict], str | None]:
+    columns = [name for name in fields if name in SERVICE_COLUMNS]
+    # date and id are always selected, the cursor and items are keyed on them
+    selected = dict.fromkeys(columns + ["date", "id"])
+    query = query.with_only_columns(*(SERVICE_COLUMNS[name] for name in selected))
+    query = query.order_by(Service.date.desc(), Service.id.desc())
+
+    if cursor is not None:
+        query = query.filter(tuple_(Service.date, Service.id) < cursor)
+
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    next_cursor = None
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+
+    services = [{name: row._mapping[name] for name in columns} for row in rows]
+    if "items" in fields:
+        await attach_items(db, services, [row.id for row in rows])
+
+    return services, next_cursor
+
+
+async def get_user_services(
+    db: AsyncSession,
     user_id: int,
     customer: str = None,
     start_date: date = None,
     end_date: date = None,
-) -> list[Service]:
-    query = db.query(Service).filter(Service.mechanic == user_id)
+    limit: int = 50,
+    cursor: tuple[date, int] = None,
+    fields: list[str] = SERVICE_LIST_FIELDS,
+) -> tuple[list[dict], str | None]:
+    query = select(Service).filter(Service.mechanic == user_id)
 
     if customer is not None:
-        query = query.filter(Service.customer.icontains(customer))
+        query = query.filter(contains(Service.customer, customer))
 
     if start_date is not None:
         query = query.filter(Service.date >= start_date)
@@ -94,64 +171,92 @@ def get_user_services(
     if end_date is not None:
         query = query.filter(Service.date <= end_date)
 
-    return query.all()
+    return await paginate_services(db, query, limit, cursor, fields)
 
 
-def get_service(db: Session, service_id: int) -> Service:
-    return db.query(Service).get(service_id)
+async def get_service(db: AsyncSession, service_id: int) -> Service:
+    return await db.get(Service, service_id, options=[selectinload(Service.items)])
 
 
-def validate_service(db: Session, service_id: int, user_id: int) -> bool:
-    service = get_service(db, service_id)
+async def validate_service(db: AsyncSession, service_id: int, user_id: int) -> bool:
+    service = await get_service(db, service_id)
     if service:
         return service.mechanic == user_id
 
     return False
 
 
-def create_service_item(db: Session, data: ServiceItemCreate) -> ServiceItem:
+async def create_service_item(db: AsyncSession, data: ServiceItemCreate) -> ServiceItem:
     service_item = ServiceItem(service=data.service, price=data.price, title=data.title)
     db.add(service_item)
-    db.commit()
-    db.refresh(service_item)
-    service = get_service(db, data.service)
-    update_service_price(db, service)
+    await update_service_price(db, data.service, data.price)
+    await db.flush()
     return service_item
 
 
-def delete_service(db: Session, service: Service) -> Service:
-    db.delete(service)
-    db.commit()
-    db.query(ServiceItem).filter(ServiceItem.service == service.id).delete()
+async def create_service_items(
+    db: AsyncSession, service_id: int, data: list[ServiceItemCreate]
+) -> list[ServiceItem]:
+    service_items = await db.scalars(
+        insert(ServiceItem).returning(ServiceItem),
+        [{"service": service_id, "title": i.title, "price": i.price} for i in data],
+    )
+    service_items = service_items.all()
+    await update_service_price(db, service_id, sum(i.price for i in data))
+    await db.flush()
+    return service_items
+
+
+async def delete_service(db: AsyncSession, service: Service) -> Service:
+    await db.delete(service)
+    await add_revenue(
+        db,
+        service.date,
+        service.mechanic,
+        service.car,
+        revenue=-service.total_price,
+        services=-1,
+    )
+    await db.flush()
     return service
 
 
-def update_service(db: Session, service: Service, data: ServiceUpdate) -> Service:
+async def update_service(
+    db: AsyncSession, service: Service, data: ServiceUpdate
+) -> Service:
+    old_bucket = (service.date, service.mechanic, service.car)
     service.car = data.car
     service.customer = data.customer
     service.date = data.date
-    db.commit()
+
+    new_bucket = (service.date, service.mechanic, service.car)
+    if new_bucket != old_bucket:
+        await add_revenue(db, *old_bucket, revenue=-service.total_price, services=-1)
+        await add_revenue(db, *new_bucket, revenue=service.total_price, services=1)
+
+    await db.flush()
     return service
 
 
-def get_service_item(db: Session, item_id: id) -> ServiceItem:
-    return db.query(ServiceItem).get(item_id)
+async def get_service_item(db: AsyncSession, item_id: id) -> ServiceItem:
+    return await db.get(ServiceItem, item_id)
 
 
-def update_service_item(
-    db: Session, service_item: ServiceItem, data: ServiceItemUpdate
+async def update_service_item(
+    db: AsyncSession, service_item: ServiceItem, data: ServiceItemUpdate
 ) -> ServiceItem:
+    delta = data.price - service_item.price
     service_item.title = data.title
     service_item.price = data.price
-    db.commit()
-    service = get_service(db, service_item.service)
-    update_service_price(db, service)
+    await update_service_price(db, service_item.service, delta)
+    await db.flush()
     return service_item
 
 
-def delete_service_item(db: Session, service_item: ServiceItem) -> ServiceItem:
-    db.delete(service_item)
-    db.commit()
-    service = get_service(db, service_item.service)
-    update_service_price(db, service)
+async def delete_service_item(
+    db: AsyncSession, service_item: ServiceItem
+) -> ServiceItem:
+    await db.delete(service_item)
+    await update_service_price(db, service_item.service, -service_item.price)
+    await db.flush()
     return service_item
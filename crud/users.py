@@ -1,33 +1,53 @@
-from passlib.context import CryptContext
+from time import monotonic
 
+from sqlalchemy import select
+
+from database import on_commit
+from hashing import hash_password, verify_and_update_password
 from models.users import User
+from settings import TOKEN_VERSION_TTL
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# user id -> (token version or None for deleted users, expiry)
+token_versions: dict[int, tuple[int | None, float]] = {}
 
 
-def create_user(db, user, is_admin=False):
-    hashed_password = pwd_context.hash(user.password)
+async def create_user(db, user, is_admin=False):
+    hashed_password = await hash_password(user.password)
     db_user = User(
         username=user.username, hashed_password=hashed_password, is_admin=is_admin
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    on_commit(db, lambda: remember_token_version(db_user.id, db_user.token_version))
     return db_user
 
 
-def get_user(db, username):
-    return db.query(User).filter(User.username == username).first()
-
+async def get_user(db, username):
+    return await db.scalar(select(User).filter(User.username == username).limit(1))
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
 
-
-def authenticate_user(db, username: str, password: str):
-    user = get_user(db, username)
+async def authenticate_user(db, username: str, password: str):
+    user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.flush()
     return user
+
+
+def remember_token_version(user_id: int, version: int | None):
+    token_versions[user_id] = (version, monotonic() + TOKEN_VERSION_TTL)
+
+
+async def get_token_version(db, user_id: int) -> int | None:
+    cached = token_versions.get(user_id)
+    if cached is not None and cached[1] > monotonic():
+        return cached[0]
+
+    version = await db.scalar(select(User.token_version).filter(User.id == user_id))
+    remember_token_version(user_id, version)
+    return version
@@ -1,20 +1,222 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import logging
+import re
+from time import perf_counter
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./db.sqlite"
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+from metrics import current_route, track_queries
+from settings import (
+    ASYNC_DATABASE_URL,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_RECYCLE,
+    DATABASE_POOL_SIZE,
+    DATABASE_POOL_TIMEOUT,
+    DATABASE_READ_URL,
+    DATABASE_URL,
+    SLOW_QUERY_LOG_PARAMETERS,
+    SLOW_QUERY_MAX_STATEMENTS,
+    SLOW_QUERY_SECONDS,
+    SQLITE_PRAGMAS,
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
+logger = logging.getLogger("slow_query")
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+def read_only_url(url: str) -> str | None:
+    scheme, path = url.split(":///", 1) if ":///" in url else (url, "")
+    if not scheme.startswith("sqlite") or path in ("", ":memory:"):
+        return None
+
+    return async_url(f"{scheme}:///file:{path}?mode=ro&uri=true")
+
+
+def engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}}
+
+    return {
+        "pool_size": DATABASE_POOL_SIZE,
+        "max_overflow": DATABASE_MAX_OVERFLOW,
+        "pool_timeout": DATABASE_POOL_TIMEOUT,
+        "pool_recycle": DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
 
 
-def get_db():
-    db = SessionLocal()
+def set_sqlite_pragmas(engine: Engine, pragmas: dict[str, str]):
+    if engine.dialect.name != "sqlite":
+        return
+
+    # sqlite only enforces foreign keys, and so ON DELETE CASCADE, when asked
+    pragmas = {"foreign_keys": "ON", **pragmas}
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+# normalized statement -> aggregate of its slow executions
+slow_queries: dict[str, dict] = {}
+
+
+def normalize_statement(statement: str) -> str:
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    statement = re.sub(r"%\(\w+\)s|\$\d+|(?<![:\w]):\w+", "?", statement)
+    statement = re.sub(r"\b\d+(?:\.\d+)?\b", "?", statement)
+    statement = re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", statement)
+    return " ".join(statement.split())
+
+
+def explain(conn, statement: str, parameters) -> list[str]:
+    if conn.dialect.name != "sqlite":
+        return []
+
+    cursor = conn.connection.dbapi_connection.cursor()
     try:
-        yield db
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"explain failed: {e}"]
     finally:
-        db.close()
+        cursor.close()
+
+
+def record_slow_query(conn, statement: str, parameters, executemany, elapsed):
+    route = current_route()
+    plan = [] if executemany else explain(conn, statement, parameters)
+    shown = repr(parameters)[:500] if SLOW_QUERY_LOG_PARAMETERS else "<hidden>"
+    logger.warning(
+        "slow query %.3fs route=%s sql=%s parameters=%s plan=%s",
+        elapsed,
+        route,
+        " ".join(statement.split()),
+        shown,
+        plan,
+    )
+
+    key = normalize_statement(statement)
+    entry = slow_queries.get(key)
+    if entry is None:
+        if len(slow_queries) >= SLOW_QUERY_MAX_STATEMENTS:
+            del slow_queries[min(slow_queries, key=lambda k: slow_queries[k]["total"])]
+        entry = slow_queries[key] = {"count": 0, "total": 0.0, "max": 0.0}
+
+    entry["count"] += 1
+    entry["total"] += elapsed
+    if elapsed >= entry["max"]:
+        entry.update(max=elapsed, parameters=shown, route=route, plan=plan)
+
+
+def track_slow_queries(engine: Engine, threshold: float = SLOW_QUERY_SECONDS):
+    if threshold <= 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_start = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - context._slow_query_start
+        if elapsed >= threshold:
+            record_slow_query(conn, statement, parameters, executemany, elapsed)
+
+
+def create_db_engine(
+    url: str = DATABASE_URL, pragmas: dict[str, str] = SQLITE_PRAGMAS
+) -> Engine:
+    db_engine = create_engine(url, **engine_options(url))
+    set_sqlite_pragmas(db_engine, pragmas)
+    track_queries(db_engine)
+    track_slow_queries(db_engine)
+    return db_engine
+
+
+def create_async_db_engine(
+    url: str = None, pragmas: dict[str, str] = SQLITE_PRAGMAS
+) -> AsyncEngine:
+    url = url or ASYNC_DATABASE_URL or async_url(DATABASE_URL)
+    db_engine = create_async_engine(url, **engine_options(url))
+    set_sqlite_pragmas(db_engine.sync_engine, pragmas)
+    track_queries(db_engine.sync_engine)
+    track_slow_queries(db_engine.sync_engine)
+    return db_engine
+
+
+engine = create_db_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+# reads go to DATABASE_READ_URL when a replica is configured, otherwise to
+# a read-only connection on the same sqlite file, otherwise to the primary
+read_url = DATABASE_READ_URL or read_only_url(DATABASE_URL)
+read_engine = (
+    create_async_db_engine(
+        read_url, {k: v for k, v in SQLITE_PRAGMAS.items() if k != "journal_mode"}
+    )
+    if read_url
+    else async_engine
+)
+ReadSessionLocal = async_sessionmaker(
+    read_engine, autoflush=False, expire_on_commit=False
+)
+
+Base = declarative_base()
+
+
+# a request is one unit of work: crud functions only flush, the session is
+# committed once the endpoint returns and rolled back if it raises
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
+def on_commit(db, callback):
+    db.info.setdefault("on_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def run_on_commit(session: Session):
+    for callback in session.info.pop("on_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_on_commit(session: Session):
+    session.info.pop("on_commit", None)
+
+
+def dialect_insert(db, model):
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
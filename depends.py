@@ -0,0 +1,13 @@
+from fastapi import Depends, Request
+
+from database import AsyncSessionLocal, ReadSessionLocal
+from read_pins import READ_PIN_COOKIE, reads_pinned
+from routers.users import get_current_user
+from schemas.users import TokenUser
+
+
+async def get_read_db(request: Request, _: TokenUser = Depends(get_current_user)):
+    pinned = reads_pinned(request.cookies.get(READ_PIN_COOKIE))
+    sessions = AsyncSessionLocal if pinned else ReadSessionLocal
+    async with sessions() as db:
+        yield db
@@ -0,0 +1,75 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from settings import (
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+)
+
+# min and max rounds are pinned to the configured cost so that any hash made
+# with another cost is reported by verify_and_update and rehashed on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=PASSWORD_HASH_ROUNDS,
+    bcrypt__min_rounds=PASSWORD_HASH_ROUNDS,
+    bcrypt__max_rounds=PASSWORD_HASH_ROUNDS,
+)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordPool:
+    def __init__(self, workers: int, executor: str = "thread"):
+        self.workers = workers
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self._executor: Executor = (
+            ProcessPoolExecutor(workers)
+            if executor == "process"
+            else ThreadPoolExecutor(workers, thread_name_prefix="bcrypt")
+        )
+        self._slots = asyncio.Semaphore(workers)
+
+    async def run(self, func, *args):
+        self.queued += 1
+        async with self._slots:
+            self.queued -= 1
+            self.active += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, func, *args)
+            finally:
+                self.active -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queued": self.queued,
+            "completed": self.completed,
+        }
+
+
+password_pool = PasswordPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_EXECUTOR)
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(_hash, password)
+
+
+async def verify_and_update_password(
+    password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await password_pool.run(_verify_and_update, password, hashed_password)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import tempfile
+import uuid
+from collections import OrderedDict
+from contextlib import suppress
+from datetime import datetime, timezone
+
+from settings import JOB_DIR, JOB_HISTORY, JOB_WORKERS
+
+logger = logging.getLogger("jobs")
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Job:
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.done = 0
+        self.total: int | None = None
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.created_at = now()
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+        self.path: str | None = None
+        self.filename: str | None = None
+        self.media_type: str | None = None
+        self.task: asyncio.Task | None = None
+        self._temporary: list[str] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def advance(self, count: int):
+        self.done += count
+
+    def temporary_file(self) -> str:
+        fd, path = tempfile.mkstemp(prefix=f"job-{self.id}-", dir=JOB_DIR)
+        os.close(fd)
+        self._temporary.append(path)
+        return path
+
+    def result_file(self, filename: str, media_type: str) -> str:
+        fd, self.path = tempfile.mkstemp(prefix=f"job-{self.id}-", dir=JOB_DIR)
+        os.close(fd)
+        self.filename = filename
+        self.media_type = media_type
+        return self.path
+
+    def remove_files(self, keep_result: bool = False):
+        paths = self._temporary
+        if self.path and not keep_result:
+            paths.append(self.path)
+            self.path = None
+
+        for path in paths:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+        self._temporary = []
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "download": self.path is not None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobRunner:
+    def __init__(self, workers: int, history: int):
+        self.workers = workers
+        self.history = history
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._slots = asyncio.Semaphore(workers)
+
+    def submit(self, job: Job, work) -> Job:
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, work))
+        self._evict()
+        return job
+
+    async def _run(self, job: Job, work):
+        try:
+            async with self._slots:
+                job.status = "running"
+                job.started_at = now()
+                job.result = await work(job)
+                job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.exception("job %s (%s) failed", job.id, job.kind)
+            job.status = "failed"
+            job.error = str(e) or type(e).__name__
+        finally:
+            job.finished_at = now()
+            job.task = None
+            job.remove_files(keep_result=job.status == "succeeded")
+
+    def _evict(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished[: max(len(finished) - self.history, 0)]:
+            job.remove_files()
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        return list(reversed(self._jobs.values()))
+
+    async def cancel(self, job: Job) -> bool:
+        task = job.task
+        if task is None:
+            return False
+
+        task.cancel()
+        await asyncio.wait([task])
+        return True
+
+    def stats(self) -> dict:
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "finished": sum(status in FINISHED for status in statuses),
+        }
+
+
+job_runner = JobRunner(JOB_WORKERS, JOB_HISTORY)
@@ -1,9 +1,19 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
-from database import Base, engine
+from cache import catalogue_cache
+from compression import CompressionMiddleware
+from hashing import password_pool
+from jobs import job_runner
+from metrics import MetricsMiddleware, register_gauges, render
+from migrations import migrate
+from models.reports import RevenueDaily
 from models.services import Car, Company, Service, ServiceItem
 from models.users import User
+from read_pins import ReadPinMiddleware
 from routers.admin import router as admin_router
+from routers.jobs import router as jobs_router
+from routers.reports import router as reports_router
 from routers.service import router as service_router
 from routers.users import router as users_router
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,7 +26,24 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
-Base.metadata.create_all(engine)
+migrate()
+
+
+app.add_middleware(ReadPinMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+register_gauges("password_hash_pool", password_pool.stats)
+register_gauges("catalogue_cache", catalogue_cache.stats)
+register_gauges("jobs", job_runner.stats)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(users_router, prefix="/user")
 app.include_router(admin_router, prefix="/admin")
+app.include_router(reports_router, prefix="/admin/report")
+app.include_router(jobs_router, prefix="/admin/jobs")
 app.include_router(service_router, prefix="/service")
@@ -0,0 +1,159 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlalchemy import Engine, event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# [statements, seconds] of the request being handled, shared with the
+# greenlets sqlalchemy runs the async driver in
+request_queries: ContextVar[list | None] = ContextVar("request_queries", default=None)
+request_scope: ContextVar[dict | None] = ContextVar("request_scope", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+queries_per_request = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+requests_total = defaultdict(int)
+query_seconds_total = defaultdict(float)
+gauges = {}
+
+
+def track_queries(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        stats = request_queries.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += perf_counter() - context._query_start
+
+
+def register_gauges(prefix: str, stats):
+    gauges[prefix] = stats
+
+
+def current_route() -> str | None:
+    scope = request_scope.get()
+    if scope is None:
+        return None
+
+    return f"{scope['method']} {route_template(scope)}"
+
+
+def route_template(scope) -> str:
+    if "route" not in scope:
+        return "unmatched"
+
+    # rebuilt from the path, routes of included routers lack their prefix
+    params = {str(value): name for name, value in scope["path_params"].items()}
+    return "/".join(
+        "{" + params[segment] + "}" if segment in params else segment
+        for segment in scope["path"].split("/")
+    )
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = perf_counter()
+        stats = [0, 0.0]
+        status = 500
+        token = request_queries.set(stats)
+        scope_token = request_scope.set(scope)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_queries.reset(token)
+            request_scope.reset(scope_token)
+            key = (scope["method"], route_template(scope))
+            latency[key].observe(perf_counter() - start)
+            requests_total[key + (str(status),)] += 1
+            queries_per_request[key].observe(stats[0])
+            query_seconds_total[key] += stats[1]
+
+
+def labels(**values) -> str:
+    pairs = ",".join(f'{name}="{value}"' for name, value in values.items())
+    return "{" + pairs + "}"
+
+
+def render_histogram(name: str, help_text: str, histograms: dict) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            bucket = labels(method=method, route=route, le=bound)
+            lines.append(f"{name}_bucket{bucket} {cumulative}")
+        lines.append(f"{name}_sum{labels(method=method, route=route)} {histogram.sum}")
+        lines.append(
+            f"{name}_count{labels(method=method, route=route)} {histogram.count}"
+        )
+    return lines
+
+
+def render() -> str:
+    lines = render_histogram(
+        "http_request_duration_seconds", "Request latency by route.", latency
+    )
+    lines += [
+        "# HELP http_requests_total Requests by route and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(requests_total.items()):
+        lines.append(
+            f"http_requests_total{labels(method=method, route=route, status=status)} "
+            f"{count}"
+        )
+
+    lines += render_histogram(
+        "db_statements_per_request",
+        "SQL statements executed per request.",
+        queries_per_request,
+    )
+    lines += [
+        "# HELP db_statement_seconds_total Time spent in SQL statements by route.",
+        "# TYPE db_statement_seconds_total counter",
+    ]
+    for (method, route), seconds in sorted(query_seconds_total.items()):
+        lines.append(
+            f"db_statement_seconds_total{labels(method=method, route=route)} {seconds}"
+        )
+
+    for prefix, stats in gauges.items():
+        for name, value in stats().items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+
+    return "\n".join(lines) + "\n"
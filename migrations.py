@@ -0,0 +1,342 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import Connection, Engine, inspect, text
+
+from crud.search import FTS_TABLES
+
+from database import Base, engine
+from settings import MIGRATION_LOCK_TIMEOUT
+
+# any constant shared by every process migrating the same database
+MIGRATION_LOCK_KEY = 7_412_031
+
+
+def add_user_token_version(conn: Connection):
+    columns = {column["name"] for column in inspect(conn).get_columns("user")}
+    if "token_version" not in columns:
+        conn.execute(
+            text(
+                'ALTER TABLE "user" '
+                "ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"
+            )
+        )
+
+
+def add_hot_column_indexes(conn: Connection):
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_service_mechanic_date "
+            "ON service (mechanic, date)"
+        )
+    )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_service_date ON service (date)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_service_car ON service (car)"))
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_service_item_service "
+            "ON service_item (service)"
+        )
+    )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_car_company ON car (company)"))
+
+
+def add_full_text_search(conn: Connection):
+    if conn.dialect.name != "sqlite":
+        return
+
+    for fts_table, (table, column) in FTS_TABLES.items():
+        conn.execute(
+            text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+                f"{column}, content='{table}', content_rowid='id', "
+                "tokenize='trigram')"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} "
+                f"BEGIN INSERT INTO {fts_table} (rowid, {column}) "
+                f"VALUES (new.id, new.{column}); END"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} "
+                f"BEGIN INSERT INTO {fts_table} ({fts_table}, rowid, {column}) "
+                f"VALUES ('delete', old.id, old.{column}); END"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au "
+                f"AFTER UPDATE OF {column} ON {table} "
+                f"BEGIN INSERT INTO {fts_table} ({fts_table}, rowid, {column}) "
+                f"VALUES ('delete', old.id, old.{column}); "
+                f"INSERT INTO {fts_table} (rowid, {column}) "
+                f"VALUES (new.id, new.{column}); END"
+            )
+        )
+        conn.execute(text(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')"))
+
+
+def add_revenue_rollup(conn: Connection):
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS revenue_daily ("
+            "day DATE NOT NULL, "
+            'mechanic INTEGER NOT NULL REFERENCES "user" (id), '
+            "car INTEGER NOT NULL REFERENCES car (id), "
+            "revenue DECIMAL NOT NULL DEFAULT 0, "
+            "services INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (day, mechanic, car))"
+        )
+    )
+    conn.execute(text("DELETE FROM revenue_daily"))
+    conn.execute(
+        text(
+            "INSERT INTO revenue_daily (day, mechanic, car, revenue, services) "
+            "SELECT date, mechanic, car, coalesce(sum(total_price), 0), count(*) "
+            "FROM service "
+            "WHERE date IS NOT NULL AND mechanic IS NOT NULL AND car IS NOT NULL "
+            "GROUP BY date, mechanic, car"
+        )
+    )
+
+
+# child tables in parent-first order, with the columns of their cascading
+# definition, and the (column, parent, on delete) foreign keys they carry.
+# services outlive their mechanic, like they did when the orm nulled the
+# column on user delete. constraints
+# are spelled out at table level, the only form sqlite reflection reads
+# ON DELETE from. revenue_daily got its own in keep_unassigned_revenue
+CASCADING_TABLES = {
+    "car": (
+        "id INTEGER NOT NULL, name VARCHAR, company INTEGER, PRIMARY KEY (id), "
+        "CONSTRAINT uq_name_comp UNIQUE (name, company), "
+        "FOREIGN KEY(company) REFERENCES company (id) ON DELETE CASCADE",
+        [("company", "company", "CASCADE")],
+    ),
+    "service": (
+        "id INTEGER NOT NULL, mechanic INTEGER, customer VARCHAR, date DATE, "
+        "total_price DECIMAL, car INTEGER, PRIMARY KEY (id), "
+        'FOREIGN KEY(mechanic) REFERENCES "user" (id) ON DELETE SET NULL, '
+        "FOREIGN KEY(car) REFERENCES car (id) ON DELETE CASCADE",
+        [("mechanic", "user", "SET NULL"), ("car", "car", "CASCADE")],
+    ),
+    "service_item": (
+        "id INTEGER NOT NULL, title VARCHAR, price DECIMAL, service INTEGER, "
+        "PRIMARY KEY (id), "
+        "FOREIGN KEY(service) REFERENCES service (id) ON DELETE CASCADE",
+        [("service", "service", "CASCADE")],
+    ),
+}
+
+
+def on_delete_actions(conn: Connection, table: str) -> dict[str, str]:
+    actions = {}
+    for foreign_key in inspect(conn).get_foreign_keys(table):
+        action = foreign_key["options"].get("ondelete", "")
+        actions[foreign_key["constrained_columns"][0]] = action.upper()
+    return actions
+
+
+def add_cascading_foreign_keys(conn: Connection):
+    # on sqlite migrate() runs with foreign keys off, the tables below are
+    # rebuilt while rows still point at them
+    sqlite = conn.dialect.name == "sqlite"
+
+    # rows the foreign keys would already have removed or detached: cars of
+    # deleted companies, their services, and the items delete_service used
+    # to leave behind
+    changed = conn.execute(
+        text("DELETE FROM service_item WHERE service IS NULL")
+    ).rowcount
+    for table, (_, foreign_keys) in CASCADING_TABLES.items():
+        for column, parent, action in foreign_keys:
+            change = "DELETE FROM" if action == "CASCADE" else "UPDATE"
+            assign = "" if action == "CASCADE" else f" SET {column} = NULL"
+            changed += conn.execute(
+                text(
+                    f"{change} {table}{assign} WHERE {column} IS NOT NULL "
+                    f'AND {column} NOT IN (SELECT id FROM "{parent}")'
+                )
+            ).rowcount
+
+    rebuilt = False
+    for table, (columns, foreign_keys) in CASCADING_TABLES.items():
+        actions = on_delete_actions(conn, table)
+        if all(actions.get(column) == action for column, _, action in foreign_keys):
+            continue
+
+        rebuilt = True
+        if not sqlite:
+            names = {
+                foreign_key["constrained_columns"][0]: foreign_key["name"]
+                for foreign_key in inspect(conn).get_foreign_keys(table)
+            }
+            for column, parent, action in foreign_keys:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} DROP CONSTRAINT {names[column]}, "
+                        f"ADD CONSTRAINT {names[column]} FOREIGN KEY ({column}) "
+                        f'REFERENCES "{parent}" (id) ON DELETE {action}'
+                    )
+                )
+            continue
+
+        # sqlite cannot alter a constraint, the table is copied into a new one
+        names = ", ".join(column["name"] for column in inspect(conn).get_columns(table))
+        conn.execute(text(f"CREATE TABLE {table}_new ({columns})"))
+        conn.execute(
+            text(f"INSERT INTO {table}_new ({names}) SELECT {names} FROM {table}")
+        )
+        conn.execute(text(f"DROP TABLE {table}"))
+        conn.execute(text(f"ALTER TABLE {table}_new RENAME TO {table}"))
+
+    if sqlite and rebuilt:
+        # dropping the old tables took their indexes and search triggers
+        add_hot_column_indexes(conn)
+        add_full_text_search(conn)
+    if changed:
+        add_revenue_rollup(conn)
+
+
+# buckets keep the revenue of deleted mechanics, with mechanic NULL like
+# their services, under a surrogate key since NULL cannot be part of one
+REVENUE_DAILY_COLUMNS = (
+    "id {key} NOT NULL, day DATE NOT NULL, mechanic INTEGER, car INTEGER NOT NULL, "
+    "revenue DECIMAL NOT NULL DEFAULT 0, services INTEGER NOT NULL DEFAULT 0, "
+    "PRIMARY KEY (id), "
+    "CONSTRAINT uq_revenue_bucket UNIQUE (day, mechanic, car), "
+    'FOREIGN KEY(mechanic) REFERENCES "user" (id) ON DELETE SET NULL, '
+    "FOREIGN KEY(car) REFERENCES car (id) ON DELETE CASCADE"
+)
+
+
+def fill_revenue_rollup(conn: Connection):
+    conn.execute(text("DELETE FROM revenue_daily"))
+    conn.execute(
+        text(
+            "INSERT INTO revenue_daily (day, mechanic, car, revenue, services) "
+            "SELECT date, mechanic, car, coalesce(sum(total_price), 0), count(*) "
+            "FROM service WHERE date IS NOT NULL AND car IS NOT NULL "
+            "GROUP BY date, mechanic, car"
+        )
+    )
+
+
+def keep_unassigned_revenue(conn: Connection):
+    columns = {column["name"] for column in inspect(conn).get_columns("revenue_daily")}
+    if "id" not in columns:
+        # the rollup is derived data, the table is recreated and refilled
+        key = "INTEGER" if conn.dialect.name == "sqlite" else "SERIAL"
+        conn.execute(text("DROP TABLE revenue_daily"))
+        conn.execute(
+            text(
+                f"CREATE TABLE revenue_daily ({REVENUE_DAILY_COLUMNS.format(key=key)})"
+            )
+        )
+    fill_revenue_rollup(conn)
+
+
+# append only: a deployed database is upgraded by running every migration
+# after the last version recorded in its schema_version table. Migrations
+# must be idempotent, a fresh database runs all of them after create_all.
+MIGRATIONS = [
+    add_user_token_version,
+    add_hot_column_indexes,
+    add_full_text_search,
+    add_revenue_rollup,
+    add_cascading_foreign_keys,
+    keep_unassigned_revenue,
+]
+
+
+def current_version(conn: Connection) -> int | None:
+    if not inspect(conn).has_table("schema_version"):
+        return None
+
+    return conn.scalar(text("SELECT max(version) FROM schema_version")) or 0
+
+
+def stamp(conn: Connection, version: int, name: str):
+    conn.execute(
+        text(
+            "INSERT INTO schema_version (version, name, applied_at) "
+            "VALUES (:version, :name, :applied_at)"
+        ),
+        {"version": version, "name": name, "applied_at": datetime.now(timezone.utc)},
+    )
+
+
+@contextmanager
+def migration_lock(conn: Connection):
+    if conn.dialect.name != "sqlite":
+        with conn.begin():
+            if conn.dialect.name == "postgresql":
+                conn.execute(
+                    text("SELECT pg_advisory_xact_lock(:key)"),
+                    {"key": MIGRATION_LOCK_KEY},
+                )
+            yield
+        return
+
+    # pysqlite would only open a deferred transaction at the first write.
+    # taking the write lock up front makes workers that start together wait
+    # for the first one to finish instead of racing it
+    conn.exec_driver_sql(f"PRAGMA busy_timeout={int(MIGRATION_LOCK_TIMEOUT * 1000)}")
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.exec_driver_sql("ROLLBACK")
+        raise
+    conn.exec_driver_sql("COMMIT")
+
+
+def migrate(bind: Engine = engine) -> int:
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            # transactions are opened by migration_lock
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            # rows older deletes left dangling must not fail the migrations
+            # that run before add_cascading_foreign_keys cleans them up.
+            # the pragma is a no-op inside a transaction, so it goes first
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+
+        with migration_lock(conn):
+            version = current_version(conn)
+            if version is None:
+                fresh = not inspect(conn).get_table_names()
+                conn.execute(
+                    text(
+                        "CREATE TABLE IF NOT EXISTS schema_version ("
+                        "version INTEGER PRIMARY KEY, name VARCHAR, "
+                        "applied_at DATETIME)"
+                    )
+                )
+                if fresh:
+                    # tables come from the models, migrations then only add
+                    # what the models cannot express (virtual tables,
+                    # triggers, data)
+                    Base.metadata.create_all(conn)
+                version = 0
+
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                migration(conn)
+                stamp(conn, number, migration.__name__)
+
+    if bind.dialect.name == "sqlite":
+        # the pool would otherwise hand out this connection with foreign keys
+        # off, new connections get them from set_sqlite_pragmas
+        bind.dispose()
+
+    return len(MIGRATIONS)
+
+
+if __name__ == "__main__":
+    import models.reports  # noqa: F401
+    import models.users  # noqa: F401
+
+    print(f"database at schema version {migrate()}")
@@ -0,0 +1,18 @@
+from sqlalchemy import DECIMAL, Column, Date, ForeignKey, Integer, UniqueConstraint
+
+from database import Base
+
+
+class RevenueDaily(Base):
+    __tablename__ = "revenue_daily"
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    # like the services it rolls up, a bucket outlives its mechanic
+    mechanic = Column(Integer, ForeignKey("user.id", ondelete="SET NULL"))
+    car = Column(Integer, ForeignKey("car.id", ondelete="CASCADE"), nullable=False)
+    revenue = Column(DECIMAL, nullable=False, default=0)
+    services = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("day", "mechanic", "car", name="uq_revenue_bucket"),
+    )
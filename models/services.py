@@ -3,6 +3,7 @@ from sqlalchemy import (
     Column,
     Date,
     ForeignKey,
+    Index,
     Integer,
     String,
     UniqueConstraint,
@@ -17,30 +18,39 @@ class Company(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True)
 
-    cars = relationship("Car")
+    cars = relationship("Car", cascade="all, delete", passive_deletes=True)
 
 
 class Car(Base):
     __tablename__ = "car"
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    company = Column(Integer, ForeignKey("company.id"))
+    company = Column(Integer, ForeignKey("company.id", ondelete="CASCADE"))
 
-    services = relationship("Service")
+    services = relationship("Service", cascade="all, delete", passive_deletes=True)
 
-    __table_args__ = (UniqueConstraint("name", "company", name="uq_name_comp"),)
+    __table_args__ = (
+        UniqueConstraint("name", "company", name="uq_name_comp"),
+        Index("ix_car_company", "company"),
+    )
 
 
 class Service(Base):
     __tablename__ = "service"
     id = Column(Integer, primary_key=True)
-    mechanic = Column(Integer, ForeignKey("user.id"))
+    mechanic = Column(Integer, ForeignKey("user.id", ondelete="SET NULL"))
     customer = Column(String)
     date = Column(Date)
     total_price = Column(DECIMAL)
-    car = Column(Integer, ForeignKey("car.id"))
+    car = Column(Integer, ForeignKey("car.id", ondelete="CASCADE"))
 
-    items = relationship("ServiceItem")
+    items = relationship("ServiceItem", cascade="all, delete", passive_deletes=True)
+
+    __table_args__ = (
+        Index("ix_service_mechanic_date", "mechanic", "date"),
+        Index("ix_service_date", "date"),
+        Index("ix_service_car", "car"),
+    )
 
 
 class ServiceItem(Base):
@@ -48,4 +58,6 @@ class ServiceItem(Base):
     id = Column(Integer, primary_key=True)
     title = Column(String)
     price = Column(DECIMAL)
-    service = Column(Integer, ForeignKey("service.id"))
+    service = Column(Integer, ForeignKey("service.id", ondelete="CASCADE"))
+
+    __table_args__ = (Index("ix_service_item_service", "service"),)
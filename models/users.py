@@ -1,3 +1,5 @@
+import secrets
+
 from sqlalchemy import Boolean, Column, Integer, String
 from sqlalchemy.orm import relationship
 
@@ -12,5 +14,10 @@ class User(Base):
     username = Column(String, unique=True)
     hashed_password = Column(String)
     is_admin = Column(Boolean, default=False)
+    # random start, so tokens of a deleted user never match a new user that
+    # sqlite gives the same id to
+    token_version = Column(
+        Integer, default=lambda: secrets.randbits(31), nullable=False
+    )
 
-    services = relationship("Service")
+    services = relationship("Service", passive_deletes=True)
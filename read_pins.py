@@ -0,0 +1,58 @@
+from http.cookies import SimpleCookie
+from math import ceil
+from time import time
+
+from starlette.datastructures import MutableHeaders
+
+from settings import READ_YOUR_WRITES_SECONDS
+
+# a client's reads go to the primary for a while after it wrote something.
+# the pin travels with the client instead of living in one worker, so it
+# holds on whichever worker the next request lands
+READ_PIN_COOKIE = "read_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def reads_pinned(pin: str | None) -> bool:
+    try:
+        return float(pin) > time()
+    except (TypeError, ValueError):
+        return False
+
+
+def read_pin_cookie(seconds: float) -> str:
+    cookie = SimpleCookie()
+    cookie[READ_PIN_COOKIE] = f"{time() + seconds:.3f}"
+    cookie[READ_PIN_COOKIE].update(
+        {"max-age": ceil(seconds), "path": "/", "httponly": True, "samesite": "lax"}
+    )
+    return cookie.output(header="").strip()
+
+
+class ReadPinMiddleware:
+    def __init__(self, app, seconds: float = READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] in SAFE_METHODS
+            or self.seconds <= 0
+        ):
+            return await self.app(scope, receive, send)
+
+        # request.state, where get_current_user records who is writing
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message):
+            if (
+                message["type"] == "http.response.start"
+                and message["status"] < 400
+                and state.get("user_id") is not None
+            ):
+                headers = MutableHeaders(scope=message)
+                headers.append("set-cookie", read_pin_cookie(self.seconds))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
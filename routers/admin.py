@@ -1,9 +1,13 @@
 from datetime import date
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from cache import catalogue_cache
 from crud.admin import (
+    ADMIN_SERVICE_FIELDS,
     check_unique_car,
     create_car,
     create_company,
@@ -13,10 +17,15 @@ from crud.admin import (
     get_services,
     get_user_by_id,
     get_users,
+    recompute_service_totals,
+    services_query,
     update_car,
     update_company,
     update_user,
 )
+from crud.catalogue import import_catalogue
+from crud.export import export_services
+from crud.search import search_cars, search_companies, search_services
 from crud.services import (
     delete_service,
     delete_service_item,
@@ -31,13 +40,19 @@ from crud.services import (
     update_service_item,
 )
 from crud.users import create_user, get_user
-from database import get_db
-from models.users import User
+from database import ReadSessionLocal, get_db, on_commit, slow_queries
+from depends import get_read_db
+from responses import FastJSONResponse
 from routers.users import get_current_user
 from schemas.admin import (
     CarUpdate,
+    CatalogueImportResult,
     CompanyUpdate,
+    SearchResults,
     ServiceInDB,
+    ServicePage,
+    SlowQuery,
+    TotalsRecomputed,
     UserCreate,
     UserItem,
     UserList,
@@ -54,30 +69,42 @@ from schemas.services import (
     ServiceItemUpdate,
     ServiceUpdate,
 )
+from schemas.users import TokenUser
+from utils import decode_cursor, parse_fields
 
 router = APIRouter()
 
 
-def is_admin(user: User = Depends(get_current_user)):
+def is_admin(user: TokenUser = Depends(get_current_user)):
     if not user.is_admin:
         raise HTTPException(400, detail="you are not admin")
 
     return user
 
 
+def catalogue_format(request: Request, format: str | None) -> str:
+    if format is not None:
+        return format
+
+    content_type = request.headers.get("content-type", "")
+    return "ndjson" if "json" in content_type else "csv"
+
+
 @router.get("/user", response_model=UserList)
 async def user_list(
     username: str = None,
     is_admin: bool = None,
-    _: User = Depends(is_admin),
-    db=Depends(get_db),
+    _: TokenUser = Depends(is_admin),
+    db=Depends(get_read_db),
 ):
-    return get_users(db, is_admin, username)
+    return FastJSONResponse(await get_users(db, is_admin, username))
 
 
 @router.get("/user/{user_id}", response_model=UserItem)
-async def user_detail(user_id: int, _: User = Depends(is_admin), db=Depends(get_db)):
-    user = get_user_by_id(db, user_id)
+async def user_detail(
+    user_id: int, _: TokenUser = Depends(is_admin), db=Depends(get_read_db)
+):
+    user = await get_user_by_id(db, user_id)
     if user:
         return user
 
@@ -85,10 +112,12 @@ async def user_detail(user_id: int, _: User = Depends(is_admin), db=Depends(get_
 
 
 @router.delete("/user/{user_id}", response_model=UserItem)
-async def user_delete(user_id: int, _: User = Depends(is_admin), db=Depends(get_db)):
-    user = get_user_by_id(db, user_id)
+async def user_delete(
+    user_id: int, _: TokenUser = Depends(is_admin), db=Depends(get_db, scope="function")
+):
+    user = await get_user_by_id(db, user_id)
     if user:
-        delete_user(db, user)
+        await delete_user(db, user)
         return user
 
     raise HTTPException(404, detail="user with this id not found")
@@ -96,14 +125,16 @@ async def user_delete(user_id: int, _: User = Depends(is_admin), db=Depends(get_
 
 @router.post("/user", response_model=UserItem)
 async def user_create(
-    user: UserCreate, _: User = Depends(is_admin), db=Depends(get_db)
+    user: UserCreate,
+    _: TokenUser = Depends(is_admin),
+    db=Depends(get_db, scope="function"),
 ):
-    if get_user(db, user.username):
+    if await get_user(db, user.username):
         raise HTTPException(
             status_code=400, detail="user with this username already exists"
         )
 
-    db_user = create_user(db, user, is_admin=user.is_admin)
+    db_user = await create_user(db, user, is_admin=user.is_admin)
     return db_user
 
 
@@ -111,12 +142,12 @@ async def user_create(
 async def user_update(
     user_id: int,
     new_data: UserUpdate,
-    _: User = Depends(is_admin),
-    db: Session = Depends(get_db),
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    user = get_user_by_id(db, user_id)
+    user = await get_user_by_id(db, user_id)
 
-    if user.username != new_data.username and get_user(db, new_data.username):
+    if user.username != new_data.username and await get_user(db, new_data.username):
         raise HTTPException(
             status_code=400, detail="user with this username already exists"
         )
@@ -124,33 +155,40 @@ async def user_update(
     if not user:
         raise HTTPException(status_code=404, detail="user with this id not found")
 
-    update_user(db, user, new_data)
+    await update_user(db, user, new_data)
     return user
 
 
 @router.get("/company", response_model=list[CompanyItem])
 async def company_list(
-    name: str = None, _: User = Depends(is_admin), db: Session = Depends(get_db)
+    name: str = None,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    return get_companies(db, name)
+    return await get_companies(db, name)
 
 
 @router.post("/company", response_model=CompanyItem)
 async def company_create(
-    data: CompanyCreate, _: User = Depends(is_admin), db: Session = Depends(get_db)
+    data: CompanyCreate,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    if get_company_by_name(db, data.name):
+    if await get_company_by_name(db, data.name):
         raise HTTPException(status_code=400, detail="company with this name exists")
 
-    company = create_company(db, data)
+    company = await create_company(db, data)
+    on_commit(db, catalogue_cache.invalidate)
     return company
 
 
 @router.get("/company/{company_id}", response_model=CompanyDetail)
 async def company_detail(
-    company_id: int, _: User = Depends(is_admin), db: Session = Depends(get_db)
+    company_id: int,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    company = get_company_by_id(db, company_id)
+    company = await get_company_by_id(db, company_id)
 
     if not company:
         raise HTTPException(status_code=404, detail="company with this id not found")
@@ -160,61 +198,74 @@ async def company_detail(
 
 @router.delete("/company/{company_id}", response_model=CompanyItem)
 async def company_delete(
-    company_id: int, _: User = Depends(is_admin), db: Session = Depends(get_db)
+    company_id: int,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    company = get_company_by_id(db, company_id)
+    company = await get_company_by_id(db, company_id, with_cars=False)
 
     if not company:
         raise HTTPException(status_code=404, detail="company with this id not found")
 
-    return delete_company(db, company)
+    company = await delete_company(db, company)
+    on_commit(db, catalogue_cache.invalidate)
+    return company
 
 
 @router.put("/company/{company_id}", response_model=CompanyItem)
 async def company_update(
     company_id: int,
     data: CompanyUpdate,
-    _: User = Depends(is_admin),
-    db: Session = Depends(get_db),
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    company = get_company_by_id(db, company_id)
+    company = await get_company_by_id(db, company_id)
 
     if not company:
         raise HTTPException(status_code=404, detail="company with this id not found")
 
-    if get_company_by_name(db, data.name):
+    if await get_company_by_name(db, data.name):
         raise HTTPException(status_code=403, detail="company with this name exists")
 
-    return update_company(db, company, data)
+    company = await update_company(db, company, data)
+    on_commit(db, catalogue_cache.invalidate)
+    return company
 
 
 @router.post("/car", response_model=CarItem)
 async def car_create(
-    data: CarCreate, _: User = Depends(is_admin), db: Session = Depends(get_db)
+    data: CarCreate,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    company = get_company_by_id(db, data.company)
+    company = await get_company_by_id(db, data.company)
     if not company:
         raise HTTPException(status_code=400, detail="company with this id not found")
 
-    if check_unique_car(db, company, data.name):
+    if await check_unique_car(db, company, data.name):
         raise HTTPException(status_code=400, detail="company has car with same name")
 
-    car = create_car(db, data)
+    car = await create_car(db, data)
+    on_commit(db, catalogue_cache.invalidate)
     return car
 
 
 @router.get("/car", response_model=list[CarDetail])
 async def car_list(
-    name: str = None, _: User = Depends(is_admin), db: Session = Depends(get_db)
+    name: str = None,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    return get_cars(db, name)
+    return FastJSONResponse(await get_cars(db, name))
 
 
 @router.get("/car/{car_id}", response_model=CarDetail)
 async def car_detail(
-    car_id: int, _: User = Depends(is_admin), db: Session = Depends(get_db)
+    car_id: int,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    car = get_car_by_id(db, car_id)
+    car = await get_car_by_id(db, car_id)
 
     if not car:
         raise HTTPException(status_code=404, detail="car with this id not found")
@@ -224,104 +275,239 @@ async def car_detail(
 
 @router.delete("/car/{car_id}", response_model=CarDetail)
 async def car_delete(
-    car_id: int, _: User = Depends(is_admin), db: Session = Depends(get_db)
+    car_id: int,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    car = get_car_by_id(db, car_id)
+    car = await get_car_by_id(db, car_id)
 
     if not car:
         raise HTTPException(status_code=404, detail="car with this id not found")
 
-    return delete_car(db, car)
+    car = await delete_car(db, car)
+    on_commit(db, catalogue_cache.invalidate)
+    return car
 
 
 @router.put("/car/{car_id}", response_model=CarDetail)
 async def car_update(
     car_id: int,
     data: CarUpdate,
-    _: User = Depends(is_admin),
-    db: Session = Depends(get_db),
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    car = get_car_by_id(db, car_id)
+    car = await get_car_by_id(db, car_id)
 
     if not car:
         raise HTTPException(status_code=404, detail="car not found")
 
-    company = get_company_by_id(db, data.company)
+    company = await get_company_by_id(db, data.company)
     if not company:
         raise HTTPException(status_code=400, detail="company with this id not found")
 
-    if check_unique_car(db, company, data.name):
+    if await check_unique_car(db, company, data.name):
         raise HTTPException(status_code=400, detail="company has car with same name")
 
-    car = update_car(db, car, data)
+    car = await update_car(db, car, data)
+    on_commit(db, catalogue_cache.invalidate)
     return car
 
 
-@router.get("/service", response_model=list[ServiceInDB])
+@router.post("/catalogue/import", response_model=CatalogueImportResult)
+async def catalogue_import(
+    request: Request,
+    format: Literal["csv", "ndjson"] = None,
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
+):
+    try:
+        return await import_catalogue(
+            db, request.stream(), catalogue_format(request, format)
+        )
+    finally:
+        catalogue_cache.invalidate()
+
+
+@router.get("/search", response_model=SearchResults)
+async def search(
+    q: str = Query(min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    _: TokenUser = Depends(is_admin),
+):
+    return {
+        "services": await search_services(db, q, limit=limit),
+        "cars": await search_cars(db, q, limit),
+        "companies": await search_companies(db, q, limit),
+    }
+
+
+@router.get("/service", response_model=ServicePage)
 async def service_list(
     customer: str = None,
     mechanic: int = None,
     start_date: date = None,
     end_date: date = None,
-    db: Session = Depends(get_db),
-    _: User = Depends(is_admin),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str = None,
+    fields: str = Query(
+        None,
+        description="comma separated fields, default all. "
+        "services in the page only carry the requested fields",
+    ),
+    db: AsyncSession = Depends(get_read_db),
+    _: TokenUser = Depends(is_admin),
+):
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+    try:
+        selected = (
+            parse_fields(fields, ADMIN_SERVICE_FIELDS)
+            if fields
+            else ADMIN_SERVICE_FIELDS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    services, next_cursor = await get_services(
+        db,
+        customer,
+        mechanic,
+        start_date,
+        end_date,
+        limit,
+        position,
+        selected,
+    )
+    return FastJSONResponse({"services": services, "next_cursor": next_cursor})
+
+
+@router.get("/service/export")
+async def service_export(
+    format: Literal["csv", "ndjson"] = "csv",
+    items: Literal["flat", "nested"] = "flat",
+    customer: str = None,
+    mechanic: int = None,
+    start_date: date = None,
+    end_date: date = None,
+    _: TokenUser = Depends(is_admin),
+):
+    query = services_query(customer, mechanic, start_date, end_date)
+
+    async def rows():
+        async with ReadSessionLocal() as db:
+            async for chunk in export_services(db, query, format, items == "nested"):
+                yield chunk
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=services.{format}"},
+    )
+
+
+@router.post("/service/recompute-totals", response_model=TotalsRecomputed)
+async def service_recompute_totals(
+    db: AsyncSession = Depends(get_db, scope="function"),
+    _: TokenUser = Depends(is_admin),
+):
+    return TotalsRecomputed(updated=await recompute_service_totals(db))
+
+
+@router.get("/slow-queries", response_model=list[SlowQuery])
+async def slow_query_list(
+    limit: int = Query(20, ge=1, le=500), _: TokenUser = Depends(is_admin)
 ):
-    return get_services(db, customer, mechanic, start_date, end_date)
+    ranked = sorted(slow_queries.items(), key=lambda i: i[1]["total"], reverse=True)
+    return [
+        SlowQuery(
+            statement=statement,
+            count=entry["count"],
+            total_seconds=entry["total"],
+            max_seconds=entry["max"],
+            parameters=entry.get("parameters"),
+            route=entry.get("route"),
+            plan=entry.get("plan", []),
+        )
+        for statement, entry in ranked[:limit]
+    ]
+
+
+@router.delete("/slow-queries")
+async def slow_query_reset(_: TokenUser = Depends(is_admin)):
+    slow_queries.clear()
 
 
 @router.get("/service/{service_id}", response_model=ServiceInDB)
 async def service_detail(
-    service_id: int, db: Session = Depends(get_db), _: User = Depends(is_admin)
+    service_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    _: TokenUser = Depends(is_admin),
 ):
-    return get_service(db, service_id)
+    service = await get_service(db, service_id)
+    if not service:
+        raise HTTPException(status_code=404)
+    return service
 
 
 @router.put("/service/{service_id}", response_model=ServiceInDB)
 async def service_update(
     service_id: int,
     data: ServiceUpdate,
-    db: Session = Depends(get_db),
-    _: User = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
+    _: TokenUser = Depends(is_admin),
 ):
-    service = get_service(db, service_id)
+    service = await get_service(db, service_id)
     if not service:
         raise HTTPException(status_code=404)
-    return update_service(db, service, data)
+
+    if not await get_car_by_id(db, data.car):
+        raise HTTPException(status_code=404)
+
+    return await update_service(db, service, data)
 
 
 @router.delete("/service/{service_id}", response_model=ServiceInDB)
 async def service_delete(
-    service_id: int, db: Session = Depends(get_db), _: User = Depends(is_admin)
+    service_id: int,
+    db: AsyncSession = Depends(get_db, scope="function"),
+    _: TokenUser = Depends(is_admin),
 ):
-    service = get_service(db, service_id)
+    service = await get_service(db, service_id)
     if not service:
         raise HTTPException(status_code=404)
 
-    return delete_service(db, service)
+    return await delete_service(db, service)
 
 
 @router.put("/item/{item_id}", response_model=ServiceItemInDB)
 async def service_item_update(
     item_id: int,
     data: ServiceItemUpdate,
-    _: User = Depends(is_admin),
-    db: Session = Depends(get_db),
+    _: TokenUser = Depends(is_admin),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    item = get_service_item(db, item_id)
+    item = await get_service_item(db, item_id)
 
     if not item:
         raise HTTPException(status_code=404)
 
-    return update_service_item(db, item, data)
+    return await update_service_item(db, item, data)
 
 
 @router.delete("/item/{item_id}", response_model=ServiceItemInDB)
 async def service_item_delete(
-    item_id: int, db: Session = Depends(get_db), _: User = Depends(is_admin)
+    item_id: int,
+    db: AsyncSession = Depends(get_db, scope="function"),
+    _: TokenUser = Depends(is_admin),
 ):
-    item = get_service_item(db, item_id)
+    item = await get_service_item(db, item_id)
 
     if not item:
         raise HTTPException(status_code=404)
 
-    return delete_service_item(db, item)
+    return await delete_service_item(db, item)
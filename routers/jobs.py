@@ -0,0 +1,165 @@
+from contextlib import aclosing
+from datetime import date
+from typing import AsyncIterator, Literal
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from cache import catalogue_cache
+from crud.admin import (
+    get_service_days,
+    purge_service_day,
+    recompute_service_totals,
+    services_query,
+)
+from crud.catalogue import import_catalogue
+from crud.export import count_services, export_services
+from database import AsyncSessionLocal, ReadSessionLocal
+from jobs import Job, job_runner
+from routers.admin import catalogue_format, is_admin
+from schemas.admin import JobInfo
+from schemas.users import TokenUser
+
+router = APIRouter()
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_job(job_id: str) -> Job:
+    job = job_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job with this id not found")
+
+    return job
+
+
+async def read_file(path: str, job: Job = None) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as file:
+        while chunk := await file.read(CHUNK_SIZE):
+            if job is not None:
+                job.advance(len(chunk))
+            yield chunk
+
+
+@router.get("", response_model=list[JobInfo])
+async def job_list(_: TokenUser = Depends(is_admin)):
+    return [job.info() for job in job_runner.list()]
+
+
+@router.post("/import", response_model=JobInfo, status_code=202)
+async def import_job(
+    request: Request,
+    format: Literal["csv", "ndjson"] = None,
+    _: TokenUser = Depends(is_admin),
+):
+    format = catalogue_format(request, format)
+    job = Job("import")
+
+    # the upload is kept on disk so the request can return before the import
+    upload = job.temporary_file()
+    async with await anyio.open_file(upload, "wb") as file:
+        async for chunk in request.stream():
+            await file.write(chunk)
+            job.total = (job.total or 0) + len(chunk)
+
+    async def work(job: Job) -> dict:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await import_catalogue(db, read_file(upload, job), format)
+        finally:
+            catalogue_cache.invalidate()
+        return result.model_dump()
+
+    return job_runner.submit(job, work).info()
+
+
+@router.post("/export", response_model=JobInfo, status_code=202)
+async def export_job(
+    format: Literal["csv", "ndjson"] = "csv",
+    items: Literal["flat", "nested"] = "flat",
+    customer: str = None,
+    mechanic: int = None,
+    start_date: date = None,
+    end_date: date = None,
+    _: TokenUser = Depends(is_admin),
+):
+    query = services_query(customer, mechanic, start_date, end_date)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+
+    async def work(job: Job) -> dict:
+        path = job.result_file(f"services.{format}", media_type)
+        async with ReadSessionLocal() as db:
+            job.total = await count_services(db, query)
+            chunks = export_services(
+                db, query, format, items == "nested", progress=job.advance
+            )
+            async with (
+                await anyio.open_file(path, "w", encoding="utf-8", newline="") as file,
+                aclosing(chunks),
+            ):
+                async for chunk in chunks:
+                    await file.write(chunk)
+        return {"services": job.done}
+
+    return job_runner.submit(Job("export"), work).info()
+
+
+@router.post("/recompute-totals", response_model=JobInfo, status_code=202)
+async def recompute_totals_job(_: TokenUser = Depends(is_admin)):
+    async def work(job: Job) -> dict:
+        job.total = 1
+        async with AsyncSessionLocal() as db:
+            updated = await recompute_service_totals(db)
+            await db.commit()
+        job.advance(1)
+        return {"updated": updated}
+
+    return job_runner.submit(Job("recompute-totals"), work).info()
+
+
+@router.post("/purge", response_model=JobInfo, status_code=202)
+async def purge_job(before: date, _: TokenUser = Depends(is_admin)):
+    async def work(job: Job) -> dict:
+        deleted = 0
+        async with AsyncSessionLocal() as db:
+            days = await get_service_days(db, before)
+            job.total = len(days)
+            # one commit per day, a cancelled purge keeps the days it finished
+            for day in days:
+                deleted += await purge_service_day(db, day)
+                await db.commit()
+                job.advance(1)
+        return {"deleted": deleted}
+
+    return job_runner.submit(Job("purge"), work).info()
+
+
+@router.get("/{job_id}", response_model=JobInfo)
+async def job_detail(job_id: str, _: TokenUser = Depends(is_admin)):
+    return get_job(job_id).info()
+
+
+@router.delete("/{job_id}", response_model=JobInfo)
+async def job_cancel(job_id: str, _: TokenUser = Depends(is_admin)):
+    job = get_job(job_id)
+    if not await job_runner.cancel(job):
+        raise HTTPException(status_code=400, detail=f"job is already {job.status}")
+
+    return job.info()
+
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str, _: TokenUser = Depends(is_admin)):
+    job = get_job(job_id)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=400, detail=f"job is {job.status}")
+
+    if job.path is None:
+        return job.result
+
+    return StreamingResponse(
+        read_file(job.path),
+        media_type=job.media_type,
+        headers={"Content-Disposition": f"attachment; filename={job.filename}"},
+    )
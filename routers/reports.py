@@ -0,0 +1,26 @@
+from datetime import date
+from typing import Literal
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.reports import revenue_report
+from depends import get_read_db
+from routers.admin import is_admin
+from schemas.admin import RevenueBucket
+from schemas.users import TokenUser
+
+router = APIRouter()
+
+
+@router.get("/revenue", response_model=list[RevenueBucket])
+async def revenue(
+    group_by: Literal["day", "month", "mechanic", "car"] = "day",
+    start_date: date = None,
+    end_date: date = None,
+    mechanic: int = None,
+    car: int = None,
+    db: AsyncSession = Depends(get_read_db),
+    _: TokenUser = Depends(is_admin),
+):
+    return await revenue_report(db, group_by, start_date, end_date, mechanic, car)
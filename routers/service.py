@@ -1,11 +1,15 @@
 from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from cache import catalogue_cache
+from crud.search import search_cars, search_companies, search_services
 from crud.services import (
+    SERVICE_LIST_FIELDS,
     create_service,
     create_service_item,
+    create_service_items,
     delete_service,
     delete_service_item,
     get_car_by_id,
@@ -20,117 +24,189 @@ from crud.services import (
     validate_service,
 )
 from database import get_db
-from models.users import User
+from depends import get_read_db
+from responses import FastJSONResponse
 from routers.users import get_current_user
 from schemas.services import (
     CarDetail,
     CompanyDetail,
     CompanyItem,
+    SearchResults,
     ServiceCreate,
     ServiceInDB,
     ServiceItemCreate,
     ServiceItemInDB,
     ServiceItemUpdate,
+    ServicePage,
     ServiceUpdate,
 )
+from schemas.users import TokenUser
+from utils import decode_cursor, parse_fields
 
 router = APIRouter()
 
 
-@router.get("/", response_model=list[ServiceInDB])
+@router.get("/", response_model=ServicePage)
 async def service_list(
     customer: str = None,
     start_date: date = None,
     end_date: date = None,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str = None,
+    fields: str = Query(
+        None,
+        description="comma separated fields, default all. "
+        "services in the page only carry the requested fields",
+    ),
+    db: AsyncSession = Depends(get_read_db),
+    user: TokenUser = Depends(get_current_user),
 ):
-    services = get_user_services(db, user.id, customer, start_date, end_date)
-    return services
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+    try:
+        selected = (
+            parse_fields(fields, SERVICE_LIST_FIELDS) if fields else SERVICE_LIST_FIELDS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    services, next_cursor = await get_user_services(
+        db,
+        user.id,
+        customer,
+        start_date,
+        end_date,
+        limit,
+        position,
+        selected,
+    )
+    return FastJSONResponse({"services": services, "next_cursor": next_cursor})
 
 
 @router.post("/", response_model=ServiceInDB)
 async def service_create(
     data: ServiceCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
+    user: TokenUser = Depends(get_current_user),
 ):
-    if not get_car_by_id(db, data.car):
+    if not await get_car_by_id(db, data.car):
         raise HTTPException(status_code=404)
 
-    return create_service(db, user.id, data)
+    return await create_service(db, user.id, data)
 
 
 @router.post("/item", response_model=ServiceItemInDB)
 async def service_item_create(
     data: ServiceItemCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
+    user: TokenUser = Depends(get_current_user),
 ):
-    if not validate_service(db, data.service, user.id):
+    if not await validate_service(db, data.service, user.id):
         raise HTTPException(status_code=404)
 
-    return create_service_item(db, data)
+    return await create_service_item(db, data)
+
+
+@router.post("/item/batch", response_model=list[ServiceItemInDB])
+async def service_item_batch_create(
+    data: list[ServiceItemCreate],
+    db: AsyncSession = Depends(get_db, scope="function"),
+    user: TokenUser = Depends(get_current_user),
+):
+    service_ids = {item.service for item in data}
+    if len(service_ids) != 1:
+        raise HTTPException(
+            status_code=400, detail="items must belong to exactly one service"
+        )
+
+    service_id = service_ids.pop()
+    if not await validate_service(db, service_id, user.id):
+        raise HTTPException(status_code=404)
+
+    return await create_service_items(db, service_id, data)
 
 
 @router.get("/company", response_model=list[CompanyItem])
 async def company_list(
-    name: str = None, _: User = Depends(get_current_user), db: Session = Depends(get_db)
+    request: Request,
+    name: str = None,
+    _: TokenUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    return get_companies(db, name)
+    return await catalogue_cache.respond(
+        request, ("companies", name), list[CompanyItem], lambda: get_companies(db, name)
+    )
 
 
 @router.get("/car", response_model=list[CarDetail])
 async def car_list(
-    name: str = None, _: User = Depends(get_current_user), db: Session = Depends(get_db)
+    request: Request,
+    name: str = None,
+    _: TokenUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    return get_cars(db, name)
+    return await catalogue_cache.respond(
+        request, ("cars", name), None, lambda: get_cars(db, name)
+    )
 
 
 @router.put("/item/{item_id}", response_model=ServiceItemInDB)
 async def service_item_update(
     item_id: int,
     data: ServiceItemUpdate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
+    user: TokenUser = Depends(get_current_user),
 ):
-    service_item = get_service_item(db, item_id)
+    service_item = await get_service_item(db, item_id)
 
-    if validate_service(db, service_item.id, user.id):
+    if await validate_service(db, service_item.id, user.id):
         raise HTTPException(404)
 
-    return update_service_item(db, service_item, data)
+    return await update_service_item(db, service_item, data)
 
 
 @router.delete("/item/{item_id}")
 async def service_item_delete(
-    item_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)
+    item_id: int,
+    db: AsyncSession = Depends(get_db, scope="function"),
+    user: TokenUser = Depends(get_current_user),
 ):
-    service_item = get_service_item(db, item_id)
+    service_item = await get_service_item(db, item_id)
 
-    if validate_service(db, service_item.id, user.id):
+    if await validate_service(db, service_item.id, user.id):
         raise HTTPException(404)
 
-    return delete_service_item(db, service_item)
+    return await delete_service_item(db, service_item)
 
 
 @router.get("/car/{car_id}", response_model=CarDetail)
 async def car_detail(
-    car_id: int, _: User = Depends(get_current_user), db: Session = Depends(get_db)
+    request: Request,
+    car_id: int,
+    _: TokenUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    car = get_car_by_id(db, car_id)
+    async def load():
+        car = await get_car_by_id(db, car_id)
+
+        if not car:
+            raise HTTPException(status_code=404, detail="car with this id not found")
 
-    if not car:
-        raise HTTPException(status_code=404, detail="car with this id not found")
+        return car
 
-    return car
+    return await catalogue_cache.respond(request, ("car", car_id), CarDetail, load)
 
 
 @router.get("/company/{company_id}", response_model=CompanyDetail)
 async def company_detail(
-    company_id: int, _: User = Depends(get_current_user), db: Session = Depends(get_db)
+    company_id: int,
+    _: TokenUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    company = get_company_by_id(db, company_id)
+    company = await get_company_by_id(db, company_id)
 
     if not company:
         raise HTTPException(status_code=404, detail="company with this id not found")
@@ -138,43 +214,57 @@ async def company_detail(
     return company
 
 
+@router.get("/search", response_model=SearchResults)
+async def search(
+    q: str = Query(min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    user: TokenUser = Depends(get_current_user),
+):
+    return {
+        "services": await search_services(db, q, user.id, limit),
+        "cars": await search_cars(db, q, limit),
+        "companies": await search_companies(db, q, limit),
+    }
+
+
 @router.get("/{service_id}", response_model=ServiceInDB)
 async def service_detail(
     service_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    user: TokenUser = Depends(get_current_user),
 ):
-    if not validate_service(db, service_id, user.id):
+    if not await validate_service(db, service_id, user.id):
         raise HTTPException(status_code=404)
 
-    return get_service(db, service_id)
+    return await get_service(db, service_id)
 
 
 @router.delete("/{service_id}", response_model=ServiceInDB)
 async def service_delete(
     service_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
+    user: TokenUser = Depends(get_current_user),
 ):
-    if not validate_service(db, service_id, user.id):
+    if not await validate_service(db, service_id, user.id):
         raise HTTPException(status_code=404)
 
-    service = get_service(db, service_id)
-    return delete_service(db, service)
+    service = await get_service(db, service_id)
+    return await delete_service(db, service)
 
 
 @router.put("/{service_id}", response_model=ServiceInDB)
 async def service_update(
     service_id: int,
     data: ServiceUpdate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
+    user: TokenUser = Depends(get_current_user),
 ):
-    if not validate_service(db, service_id, user.id):
+    if not await validate_service(db, service_id, user.id):
         raise HTTPException(status_code=404)
 
-    if not get_car_by_id(db, data.car):
+    if not await get_car_by_id(db, data.car):
         raise HTTPException(status_code=404)
 
-    service = get_service(db, service_id)
-    return update_service(db, service, data)
+    service = await get_service(db, service_id)
+    return await update_service(db, service, data)
@@ -1,21 +1,23 @@
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
-from crud.users import authenticate_user, create_user, get_user
+from crud.users import authenticate_user, create_user, get_token_version, get_user
 from database import get_db
-from schemas.users import SignupResponse, Token, UserBase, UserCreate
-from utils import ALGORITHM, SECRET_KEY, create_access_token
+from schemas.users import SignupResponse, Token, TokenUser, UserBase, UserCreate
+from utils import ALGORITHM, SECRET_KEY, create_access_token, user_claims
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/user/login")
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Any = Depends(get_db)
-):
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: Any = Depends(get_db, scope="function"),
+) -> TokenUser:
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -28,28 +30,38 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username=username)
-    if user is None:
+
+    if "uid" not in payload:
+        # tokens issued before claims were added carry only the username
+        user = await get_user(db, username=username)
+        if user is None:
+            raise credentials_exception
+        request.state.user_id = user.id
+        return TokenUser(id=user.id, username=user.username, is_admin=user.is_admin)
+
+    if await get_token_version(db, payload["uid"]) != payload.get("ver"):
         raise credentials_exception
-    return user
+
+    request.state.user_id = payload["uid"]
+    return TokenUser(id=payload["uid"], username=username, is_admin=payload["adm"])
 
 
 @router.post("/signup", response_model=SignupResponse)
-async def signup(user: UserCreate, db=Depends(get_db)):
-    if get_user(db, user.username):
+async def signup(user: UserCreate, db=Depends(get_db, scope="function")):
+    if await get_user(db, user.username):
         raise HTTPException(
             status_code=400, detail="user with this username already exists"
         )
-    user = create_user(db, user)
-    access_token = create_access_token(data={"sub": user.username})
+    user = await create_user(db, user)
+    access_token = create_access_token(data=user_claims(user))
     return SignupResponse(username=user.username, access_token=access_token)
 
 
 @router.post("/login")
-async def login(user: UserCreate, db=Depends(get_db)):
-    user = authenticate_user(db, user.username, user.password)
+async def login(user: UserCreate, db=Depends(get_db, scope="function")):
+    user = await authenticate_user(db, user.username, user.password)
 
     if not user:
         raise HTTPException(status_code=403, detail="username or password not correct")
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data=user_claims(user))
     return Token(access_token=access_token)
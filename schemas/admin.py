@@ -1,8 +1,15 @@
+import datetime
 from typing import List
 
 from pydantic import BaseModel
 
-from schemas.services import ServiceInDBBase, ServiceItemBase
+from schemas.services import (
+    CarDetail,
+    CompanyItem,
+    ServiceInDBBase,
+    ServiceItemBase,
+    ServiceListItem,
+)
 
 
 class UserBase(BaseModel):
@@ -27,7 +34,65 @@ class UserUpdate(UserBase):
 
 class ServiceInDB(ServiceInDBBase):
     items: list[ServiceItemBase]
-    mechanic: int
+    mechanic: int | None = None
+
+
+class AdminServiceListItem(ServiceListItem):
+    mechanic: int | None = None
+
+
+class ServicePage(BaseModel):
+    services: list[AdminServiceListItem]
+    next_cursor: str | None = None
+
+
+class SearchResults(BaseModel):
+    services: list[ServiceInDB]
+    cars: list[CarDetail]
+    companies: list[CompanyItem]
+
+
+class TotalsRecomputed(BaseModel):
+    updated: int
+
+
+class CatalogueImportResult(BaseModel):
+    inserted: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    companies_created: int = 0
+    errors: list[str] = []
+
+
+class RevenueBucket(BaseModel):
+    # mechanic None holds the revenue of deleted mechanics
+    key: int | datetime.date | str | None
+    revenue: int
+    services: int
+
+
+class SlowQuery(BaseModel):
+    statement: str
+    count: int
+    total_seconds: float
+    max_seconds: float
+    parameters: str | None = None
+    route: str | None = None
+    plan: list[str] = []
+
+
+class JobInfo(BaseModel):
+    id: str
+    kind: str
+    status: str
+    done: int
+    total: int | None = None
+    result: dict | None = None
+    error: str | None = None
+    download: bool = False
+    created_at: datetime.datetime
+    started_at: datetime.datetime | None = None
+    finished_at: datetime.datetime | None = None
 
 
 class CarUpdate(BaseModel):
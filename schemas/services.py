@@ -77,3 +77,25 @@ class ServiceItemInDB(ServiceItemBase):
 
 class ServiceInDB(ServiceInDBBase):
     items: list[ServiceItemBase]
+
+
+# a service as the list endpoints return it: fields= picks which of these
+# are present, so none of them is required
+class ServiceListItem(BaseModel):
+    customer: str | None = None
+    date: datetime.date | None = None
+    car: int | None = None
+    id: int | None = None
+    total_price: int | None = None
+    items: list[ServiceItemBase] | None = None
+
+
+class ServicePage(BaseModel):
+    services: list[ServiceListItem]
+    next_cursor: str | None = None
+
+
+class SearchResults(BaseModel):
+    services: list[ServiceInDB]
+    cars: list[CarDetail]
+    companies: list[CompanyItem]
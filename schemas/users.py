@@ -9,9 +9,13 @@ class UserCreate(UserBase):
     password: str
 
 
+class TokenUser(UserBase):
+    id: int
+    is_admin: bool
+
+
 class Token(BaseModel):
     access_token: str
 
 
-class SignupResponse(UserBase, Token):
-    ...
+class SignupResponse(UserBase, Token): ...
@@ -0,0 +1,222 @@
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+from sqlalchemy import func, insert, select, text, update
+
+from crud.search import FTS_TABLES
+from database import engine
+from hashing import pwd_context
+from migrations import add_full_text_search, fill_revenue_rollup, migrate
+from models.reports import RevenueDaily  # noqa: F401
+from models.services import Car, Company, Service, ServiceItem
+from models.users import User
+
+MAKES = {
+    "Toyota": ["Corolla", "Camry", "Yaris", "RAV4", "Hilux", "Land Cruiser"],
+    "Hyundai": ["Accent", "Elantra", "Sonata", "Tucson", "Santa Fe"],
+    "Kia": ["Rio", "Cerato", "Sportage", "Sorento", "Picanto"],
+    "Peugeot": ["206", "207", "405", "Pars", "2008"],
+    "Renault": ["Logan", "Sandero", "Megane", "Duster"],
+    "Nissan": ["Sunny", "Qashqai", "X-Trail", "Patrol"],
+    "BMW": ["320i", "520i", "X3", "X5"],
+    "Mercedes-Benz": ["C200", "E250", "GLC", "S500"],
+    "Volkswagen": ["Golf", "Passat", "Tiguan", "Polo"],
+    "Mazda": ["Mazda3", "Mazda6", "CX-5"],
+    "Chevrolet": ["Aveo", "Cruze", "Spark"],
+    "Honda": ["Civic", "Accord", "CR-V"],
+}
+FIRST_NAMES = [
+    "Ali", "Reza", "Sara", "Maryam", "Hossein", "Zahra", "Mohammad", "Fatemeh",
+    "Amir", "Neda", "Mehdi", "Leila", "Hamid", "Parisa", "Saeed", "Nazanin",
+]  # fmt: skip
+LAST_NAMES = [
+    "Ahmadi", "Hosseini", "Karimi", "Rezaei", "Moradi", "Jafari", "Rahimi",
+    "Mohammadi", "Sadeghi", "Ebrahimi", "Ghasemi", "Kazemi", "Najafi", "Alavi",
+]  # fmt: skip
+PARTS = {
+    "oil change": (15, 60),
+    "oil filter": (5, 25),
+    "air filter": (5, 30),
+    "brake pads": (40, 180),
+    "brake discs": (80, 400),
+    "timing belt": (120, 600),
+    "spark plugs": (20, 90),
+    "battery": (60, 250),
+    "tyre": (50, 220),
+    "wheel alignment": (20, 70),
+    "clutch kit": (200, 900),
+    "coolant flush": (30, 90),
+    "diagnostics": (10, 50),
+    "labour": (20, 300),
+}
+BULK_INDEXES = [*Service.__table__.indexes, *ServiceItem.__table__.indexes]
+
+
+def batched(rows, size: int):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def next_id(conn, column) -> int:
+    return (conn.scalar(select(func.max(column))) or 0) + 1
+
+
+def seed_catalogue(conn, rng: random.Random, mechanics: int, password: str):
+    first_user = next_id(conn, User.id)
+    hashed_password = pwd_context.hash(password)
+    conn.execute(
+        insert(User),
+        [
+            {
+                "id": i,
+                "username": f"mechanic{i}",
+                "hashed_password": hashed_password,
+                "is_admin": False,
+                "token_version": rng.getrandbits(31),
+            }
+            for i in range(first_user, first_user + mechanics)
+        ],
+    )
+
+    existing = set(conn.scalars(select(Company.name)))
+    new_companies = [{"name": name} for name in MAKES if name not in existing]
+    if new_companies:
+        conn.execute(insert(Company), new_companies)
+
+    companies = dict(conn.execute(select(Company.name, Company.id)).all())
+    existing = set(conn.execute(select(Car.company, Car.name)).all())
+    new_cars = [
+        {"company": companies[make], "name": model}
+        for make, models in MAKES.items()
+        for model in models
+        if (companies[make], model) not in existing
+    ]
+    if new_cars:
+        conn.execute(insert(Car), new_cars)
+
+    users = list(range(first_user, first_user + mechanics))
+    return users, list(conn.scalars(select(Car.id)))
+
+
+def generate_services(rng, first_id, count, mechanics, cars, days):
+    # random() and indexing into precomputed choices are several times
+    # cheaper than randint/choice, which dominate at a million rows
+    random = rng.random
+    start = date.today() - timedelta(days=days)
+    dates = [start + timedelta(days=day) for day in range(days)]
+    customers = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    for service_id in range(first_id, first_id + count):
+        yield {
+            "id": service_id,
+            "mechanic": mechanics[int(random() * len(mechanics))],
+            "customer": customers[int(random() * len(customers))],
+            "date": dates[int(random() * days)],
+            "car": cars[int(random() * len(cars))],
+            "total_price": 0,
+        }
+
+
+def generate_items(rng, first_id, count, max_items):
+    random = rng.random
+    parts = [(title, low, high - low + 1) for title, (low, high) in PARTS.items()]
+    for service_id in range(first_id, first_id + count):
+        for _ in range(1 + int(random() * max_items)):
+            title, low, spread = parts[int(random() * len(parts))]
+            yield {
+                "service": service_id,
+                "title": title,
+                "price": low + int(random() * spread),
+            }
+
+
+def drop_fts_triggers(conn):
+    if conn.dialect.name != "sqlite":
+        return
+
+    # re-created by add_full_text_search, which also rebuilds the index once
+    for fts_table in FTS_TABLES:
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}"))
+
+
+def drop_indexes(conn):
+    # building an index from sorted rows is much cheaper than keeping it up to
+    # date through millions of inserts in random (mechanic, date) order
+    for index in BULK_INDEXES:
+        index.drop(conn, checkfirst=True)
+
+
+def create_indexes(conn):
+    for index in BULK_INDEXES:
+        index.create(conn, checkfirst=True)
+
+
+def fix_totals(conn, first_id: int, last_id: int) -> int:
+    totals = (
+        select(ServiceItem.service, func.sum(ServiceItem.price).label("total"))
+        .filter(ServiceItem.service.between(first_id, last_id))
+        .group_by(ServiceItem.service)
+        .subquery()
+    )
+    result = conn.execute(
+        update(Service)
+        .filter(Service.id == totals.c.service)
+        .values(total_price=totals.c.total)
+    )
+    return result.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bulk load realistic fake data")
+    parser.add_argument("--services", type=int, default=100_000)
+    parser.add_argument("--mechanics", type=int, default=200)
+    parser.add_argument("--max-items", type=int, default=5)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--password", default="mechanic")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    migrate()
+
+    with engine.begin() as conn:
+        mechanics, cars = seed_catalogue(conn, rng, args.mechanics, args.password)
+        first_id = next_id(conn, Service.id)
+        drop_fts_triggers(conn)
+        drop_indexes(conn)
+
+    try:
+        services = generate_services(
+            rng, first_id, args.services, mechanics, cars, args.days
+        )
+        for batch in batched(services, args.batch_size):
+            with engine.begin() as conn:
+                conn.execute(insert(Service), batch)
+
+        items = generate_items(rng, first_id, args.services, args.max_items)
+        for batch in batched(items, args.batch_size):
+            with engine.begin() as conn:
+                conn.execute(insert(ServiceItem), batch)
+    finally:
+        with engine.begin() as conn:
+            create_indexes(conn)
+            add_full_text_search(conn)
+
+    with engine.begin() as conn:
+        fix_totals(conn, first_id, first_id + args.services - 1)
+        fill_revenue_rollup(conn)
+
+    print(
+        f"seeded {args.mechanics} mechanics (password {args.password!r}) and "
+        f"{args.services} services in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os
+
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+TOKEN_VERSION_TTL = float(os.getenv("TOKEN_VERSION_TTL", "30"))
+CATALOGUE_CACHE_SIZE = int(os.getenv("CATALOGUE_CACHE_SIZE", "256"))
+CATALOGUE_CACHE_TTL = float(os.getenv("CATALOGUE_CACHE_TTL", "300"))
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./db.sqlite")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+# applied to every new sqlite connection, as "name=value,name=value"
+SQLITE_PRAGMAS = dict(
+    pragma.split("=", 1)
+    for pragma in os.getenv(
+        "SQLITE_PRAGMAS",
+        "journal_mode=WAL,synchronous=NORMAL,busy_timeout=5000,"
+        "cache_size=-65536,mmap_size=268435456,temp_store=MEMORY",
+    ).split(",")
+    if pragma
+)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.2"))
+SLOW_QUERY_LOG_PARAMETERS = os.getenv("SLOW_QUERY_LOG_PARAMETERS", "0") == "1"
+SLOW_QUERY_MAX_STATEMENTS = int(os.getenv("SLOW_QUERY_MAX_STATEMENTS", "500"))
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "100"))
+# uploads and results of background jobs, the system temp dir when unset
+JOB_DIR = os.getenv("JOB_DIR") or None
+# how long a starting worker waits for another one to finish migrating
+MIGRATION_LOCK_TIMEOUT = float(os.getenv("MIGRATION_LOCK_TIMEOUT", "600"))
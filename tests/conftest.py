@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+# settings are read when the app modules are imported, so the test database
+# has to be chosen before any of them are
+DATA_DIR = tempfile.mkdtemp(prefix="mechanic-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATA_DIR}/db.sqlite"
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+
+# a mechanic and a car to hang services on
+SEED_ROWS = """
+INSERT INTO user (id, username, hashed_password, is_admin, token_version)
+VALUES (1, 'mech', 'x', 0, 0);
+INSERT INTO company VALUES (1, 'Toyota');
+INSERT INTO car VALUES (1, 'Corolla', 1);
+"""
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    import models.reports  # noqa: F401
+    import models.users  # noqa: F401
+    from database import create_db_engine
+    from migrations import migrate
+
+    path = tmp_path / "test.sqlite"
+    migrate(create_db_engine(f"sqlite:///{path}"))
+    with sqlite3.connect(path) as conn:
+        conn.executescript(SEED_ROWS)
+    return path
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from database import Base, engine
+    from main import app
+    from utils import create_access_token
+
+    # the app runs on the DATA_DIR database, emptied and reseeded for each
+    # test, with an admin signed in
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    with sqlite3.connect(f"{DATA_DIR}/db.sqlite") as conn:
+        conn.executescript(
+            SEED_ROWS + "INSERT INTO user VALUES (2, 'admin', 'x', 1, 0);"
+        )
+    token = create_access_token(data={"sub": "admin", "uid": 2, "adm": True, "ver": 0})
+
+    with TestClient(app, headers={"Authorization": f"Bearer {token}"}) as client:
+        yield client
+
+
+@pytest.fixture
+def statements() -> list[tuple]:
+    # (statement, parameters) of everything run_db executed
+    return []
+
+
+@pytest.fixture
+def run_db(database_path, statements):
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    from database import async_url, create_async_db_engine
+
+    def run_db(work):
+        async def run():
+            async_engine = create_async_db_engine(
+                async_url(f"sqlite:///{database_path}")
+            )
+
+            @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+            def collect(conn, cursor, statement, parameters, context, executemany):
+                statements.append((statement, parameters))
+
+            async with async_sessionmaker(async_engine)() as db:
+                result = await work(db)
+                await db.commit()
+            await async_engine.dispose()
+            return result
+
+        return asyncio.run(run())
+
+    return run_db
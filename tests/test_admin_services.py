@@ -0,0 +1,69 @@
+import sqlite3
+
+from conftest import DATA_DIR
+from sqlalchemy import event
+
+from database import async_engine
+
+
+def test_services_outlive_their_mechanic_in_the_admin_routes(client):
+    with sqlite3.connect(f"{DATA_DIR}/db.sqlite") as conn:
+        conn.execute("INSERT INTO service VALUES (1, 1, 'cust', '2024-01-01', 0, 1)")
+        conn.execute("INSERT INTO service VALUES (2, 1, 'cust', '2024-01-02', 0, 1)")
+
+    assert client.delete("/admin/user/1").status_code == 200
+
+    response = client.get("/admin/service/1")
+    assert response.status_code == 200
+    assert response.json()["mechanic"] is None
+
+    data = {"customer": "renamed", "date": "2024-01-03", "car": 1}
+    response = client.put("/admin/service/1", json=data)
+    assert response.status_code == 200
+    assert response.json() == {
+        **data,
+        "id": 1,
+        "total_price": 0,
+        "items": [],
+        "mechanic": None,
+    }
+
+    response = client.delete("/admin/service/2")
+    assert response.status_code == 200
+    assert response.json()["mechanic"] is None
+    assert client.get("/admin/service/2").status_code == 404
+
+
+def test_service_update_to_an_unknown_car_is_not_found(client):
+    with sqlite3.connect(f"{DATA_DIR}/db.sqlite") as conn:
+        conn.execute("INSERT INTO service VALUES (1, 1, 'cust', '2024-01-01', 0, 1)")
+
+    data = {"customer": "cust", "date": "2024-01-01", "car": 99}
+    assert client.put("/admin/service/1", json=data).status_code == 404
+    assert client.get("/admin/service/1").json()["car"] == 1
+
+
+def test_company_delete_is_one_statement(client):
+    with sqlite3.connect(f"{DATA_DIR}/db.sqlite") as conn:
+        conn.executemany(
+            "INSERT INTO car VALUES (?, ?, 1)", [(i, f"car{i}") for i in range(2, 6)]
+        )
+        conn.execute("INSERT INTO service VALUES (1, 1, 'cust', '2024-01-01', 5, 2)")
+        conn.execute("INSERT INTO service_item VALUES (1, 'oil', 5, 1)")
+
+    deletes = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("DELETE"):
+            deletes.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", collect)
+    try:
+        assert client.delete("/admin/company/1").status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", collect)
+
+    assert deletes == ["DELETE FROM company WHERE company.id = ?"]
+    with sqlite3.connect(f"{DATA_DIR}/db.sqlite") as conn:
+        for table in ("car", "service", "service_item"):
+            assert conn.execute(f"SELECT count(*) FROM {table}").fetchone() == (0,)
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import sqlite3
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from crud.admin import services_query
+from crud.export import export_services
+
+SERVICES = 20
+
+
+def seed(path):
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO service VALUES (?, 1, 'cust', '2024-01-01', 10, 1)",
+            [(i,) for i in range(1, SERVICES + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO service_item (title, price, service) VALUES ('oil', 10, ?)",
+            [(i,) for i in range(1, SERVICES + 1)],
+        )
+
+
+def cancel_after(task: asyncio.Task, hops: int):
+    if hops:
+        asyncio.get_running_loop().call_soon(cancel_after, task, hops - 1)
+    else:
+        task.cancel()
+
+
+def test_cancelled_export_closes_its_cursor(database_path, run_db, caplog):
+    seed(database_path)
+
+    async def cancel_export(sessions, hops: int) -> list[int]:
+        done = []
+
+        def progress(count):
+            done.append(count)
+            if len(done) == 2:
+                # lands somewhere in the fetch of the next batch, which runs
+                # on the driver thread for a few loop iterations
+                cancel_after(task, hops)
+
+        async def export():
+            async with sessions() as db:
+                async for _ in export_services(
+                    db, services_query(), batch_size=1, progress=progress
+                ):
+                    pass
+
+        task = asyncio.create_task(export())
+        await asyncio.wait([task])
+        assert task.cancelled()
+        return done
+
+    async def run(db):
+        # every export gets a session of its own, like export jobs do
+        sessions = async_sessionmaker(db.bind)
+        cancelled = [await cancel_export(sessions, hops) for hops in range(40)]
+        exported = [chunk async for chunk in export_services(db, services_query())]
+        return cancelled, exported
+
+    with caplog.at_level(logging.ERROR, logger="sqlalchemy"):
+        cancelled, exported = run_db(run)
+
+    assert all(len(done) < SERVICES for done in cancelled)
+    assert len("".join(exported).splitlines()) == SERVICES + 1
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+from sqlalchemy import inspect
+
+from database import create_db_engine
+from migrations import MIGRATIONS, migrate
+
+# the schema create_all produced before migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE company (
+    id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR, hashed_password VARCHAR,
+    is_admin BOOLEAN, PRIMARY KEY (id), UNIQUE (username)
+);
+CREATE TABLE car (
+    id INTEGER NOT NULL, name VARCHAR, company INTEGER, PRIMARY KEY (id),
+    CONSTRAINT uq_name_comp UNIQUE (name, company),
+    FOREIGN KEY(company) REFERENCES company (id)
+);
+CREATE TABLE service (
+    id INTEGER NOT NULL, mechanic INTEGER, customer VARCHAR, date DATE,
+    total_price DECIMAL, car INTEGER, PRIMARY KEY (id),
+    FOREIGN KEY(mechanic) REFERENCES user (id),
+    FOREIGN KEY(car) REFERENCES car (id)
+);
+CREATE TABLE service_item (
+    id INTEGER NOT NULL, title VARCHAR, price DECIMAL, service INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(service) REFERENCES service (id)
+);
+"""
+
+# what the baseline deletes left behind: company 2 was deleted with its cars
+# but not their services, service 3 after its items had been detached from
+# it, and the mechanic of service 4 is gone
+BASELINE_ROWS = """
+INSERT INTO user VALUES (1, 'mech', 'x', 0);
+INSERT INTO company VALUES (1, 'Toyota');
+INSERT INTO car VALUES (1, 'Corolla', 1);
+INSERT INTO service VALUES (1, 1, 'kept', '2024-01-01', 10, 1);
+INSERT INTO service VALUES (2, 1, 'orphan', '2024-01-02', 20, 2);
+INSERT INTO service VALUES (4, 9, 'unassigned', '2024-01-03', 0, 1);
+INSERT INTO service_item VALUES (1, 'oil', 10, 1);
+INSERT INTO service_item VALUES (2, 'tyre', 20, 2);
+INSERT INTO service_item VALUES (3, 'detached', 5, NULL);
+"""
+
+
+def baseline_engine(tmp_path):
+    path = tmp_path / "baseline.sqlite"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA + BASELINE_ROWS)
+    return create_db_engine(f"sqlite:///{path}")
+
+
+def test_baseline_database_with_orphans_upgrades(tmp_path):
+    engine = baseline_engine(tmp_path)
+
+    assert migrate(engine) == len(MIGRATIONS)
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql(
+            "SELECT id, mechanic FROM service ORDER BY id"
+        ).all() == [
+            (1, 1),
+            (4, None),
+        ]
+        assert conn.exec_driver_sql("SELECT id FROM service_item").all() == [(1,)]
+        assert conn.exec_driver_sql("PRAGMA foreign_key_check").all() == []
+        assert conn.exec_driver_sql(
+            "SELECT day, mechanic, car, revenue, services FROM revenue_daily "
+            "ORDER BY day"
+        ).all() == [("2024-01-01", 1, 1, 10, 1), ("2024-01-03", None, 1, 0, 1)]
+        assert conn.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+        foreign_keys = inspect(conn).get_foreign_keys("service_item")
+        assert foreign_keys[0]["options"]["ondelete"] == "CASCADE"
+
+
+def test_deletes_follow_the_foreign_keys(tmp_path):
+    engine = baseline_engine(tmp_path)
+    migrate(engine)
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql('DELETE FROM "user" WHERE id = 1')
+        # services and items outlive their mechanic
+        assert conn.exec_driver_sql(
+            "SELECT id, mechanic FROM service ORDER BY id"
+        ).all() == [
+            (1, None),
+            (4, None),
+        ]
+        assert conn.exec_driver_sql("SELECT id FROM service_item").all() == [(1,)]
+        assert conn.exec_driver_sql(
+            "SELECT day, mechanic, revenue FROM revenue_daily ORDER BY day"
+        ).all() == [("2024-01-01", None, 10), ("2024-01-03", None, 0)]
+
+        conn.exec_driver_sql("DELETE FROM company WHERE id = 1")
+        for table in ("car", "service", "service_item", "revenue_daily"):
+            assert conn.exec_driver_sql(f"SELECT count(*) FROM {table}").scalar() == 0
+
+
+def test_migrations_are_idempotent(tmp_path):
+    engine = baseline_engine(tmp_path)
+    migrate(engine)
+
+    assert migrate(engine) == len(MIGRATIONS)
+    with engine.connect() as conn:
+        versions = conn.exec_driver_sql("SELECT version FROM schema_version").all()
+    assert [version for version, in versions] == list(range(1, len(MIGRATIONS) + 1))
+
+
+MIGRATE = """
+from database import create_db_engine
+from migrations import migrate
+import models.reports, models.users
+migrate(create_db_engine({url!r}))
+"""
+
+
+def test_workers_starting_together_migrate_once(tmp_path):
+    url = f"sqlite:///{tmp_path / 'shared.sqlite'}"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", MIGRATE.format(url=url)],
+            cwd=root,
+            stderr=subprocess.PIPE,
+        )
+        for _ in range(4)
+    ]
+
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=60)
+        assert worker.returncode == 0, stderr.decode()
+
+    engine = create_db_engine(url)
+    with engine.connect() as conn:
+        versions = conn.exec_driver_sql("SELECT version FROM schema_version").all()
+    assert [version for version, in versions] == list(range(1, len(MIGRATIONS) + 1))
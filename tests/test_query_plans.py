@@ -0,0 +1,62 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from crud.admin import get_services
+from crud.services import get_user_services
+
+ROWS = """
+INSERT INTO service VALUES (1, 1, 'cust', '2024-01-02', 10, 1);
+INSERT INTO service_item VALUES (1, 'oil', 10, 1);
+"""
+
+
+@pytest.fixture
+def query_plans(database_path, run_db, statements):
+    with sqlite3.connect(database_path) as conn:
+        conn.executescript(ROWS)
+
+    def query_plans(list_services) -> dict[str, str]:
+        run_db(list_services)
+        with sqlite3.connect(database_path) as conn:
+            return {
+                statement: " | ".join(
+                    row[-1]
+                    for row in conn.execute(
+                        f"EXPLAIN QUERY PLAN {statement}", parameters
+                    )
+                )
+                for statement, parameters in statements
+            }
+
+    return query_plans
+
+
+def plan_for(plans: dict[str, str], table: str) -> str:
+    [plan] = [plan for statement, plan in plans.items() if f"FROM {table}" in statement]
+    return plan
+
+
+def test_mechanic_list_uses_mechanic_date_index(query_plans):
+    plans = query_plans(
+        lambda db: get_user_services(db, 1, start_date=date(2024, 1, 1))
+    )
+
+    assert "USING INDEX ix_service_mechanic_date" in plan_for(plans, "service ")
+
+
+def test_admin_date_range_uses_date_index(query_plans):
+    plans = query_plans(
+        lambda db: get_services(
+            db, start_date=date(2024, 1, 1), end_date=date(2024, 2, 1)
+        )
+    )
+
+    assert "USING INDEX ix_service_date" in plan_for(plans, "service ")
+
+
+def test_item_load_uses_service_index(query_plans):
+    plans = query_plans(lambda db: get_user_services(db, 1))
+
+    assert "USING INDEX ix_service_item_service" in plan_for(plans, "service_item")
@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from database import async_engine, read_engine
+from read_pins import READ_PIN_COOKIE
+
+
+@contextmanager
+def engines_used():
+    used = []
+
+    def collector(name):
+        def collect(conn, cursor, statement, parameters, context, executemany):
+            # the token check of get_current_user always reads the primary
+            if "user.username" in statement:
+                used.append(name)
+
+        return collect
+
+    collectors = {
+        async_engine.sync_engine: collector("primary"),
+        read_engine.sync_engine: collector("read"),
+    }
+    for engine, collect in collectors.items():
+        event.listen(engine, "before_cursor_execute", collect)
+    try:
+        yield used
+    finally:
+        for engine, collect in collectors.items():
+            event.remove(engine, "before_cursor_execute", collect)
+
+
+def read_user(client) -> list[str]:
+    with engines_used() as used:
+        assert client.get("/admin/user/1").status_code == 200
+    return used
+
+
+def test_writes_pin_the_client_reads_to_the_primary(client):
+    assert read_engine is not async_engine
+    assert read_user(client) == ["read"]
+
+    assert client.delete("/admin/service/99").status_code == 404
+    assert READ_PIN_COOKIE not in client.cookies
+    assert read_user(client) == ["read"]
+
+    response = client.post("/admin/company", json={"name": "Honda"})
+    assert response.status_code == 200
+    assert "Max-Age=5" in response.headers["set-cookie"]
+    assert read_user(client) == ["primary"]
+
+    # nothing is kept on the server, a client without the cookie reads from
+    # the replica again
+    client.cookies.clear()
+    assert read_user(client) == ["read"]
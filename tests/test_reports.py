@@ -0,0 +1,111 @@
+import sqlite3
+from datetime import date
+
+from crud.admin import delete_user, get_user_by_id
+from crud.reports import rebuild_revenue, revenue_report
+from crud.services import create_service, delete_service, get_service, update_service
+from schemas.services import ServiceCreate, ServiceUpdate
+
+
+def rollup(path) -> list[tuple]:
+    with sqlite3.connect(path) as conn:
+        return conn.execute(
+            "SELECT day, mechanic, car, revenue, services FROM revenue_daily "
+            "ORDER BY day, mechanic, car"
+        ).fetchall()
+
+
+def test_services_without_a_mechanic_are_rolled_up(database_path, run_db):
+    with sqlite3.connect(database_path) as conn:
+        conn.execute("INSERT INTO service VALUES (1, NULL, 'x', '2024-01-01', 5, 1)")
+
+    run_db(rebuild_revenue)
+    assert rollup(database_path) == [("2024-01-01", None, 1, 5, 1)]
+
+    async def delete(db):
+        await delete_service(db, await get_service(db, 1))
+
+    run_db(delete)
+
+    assert rollup(database_path) == []
+
+
+def test_deleted_mechanics_keep_their_revenue(database_path, run_db):
+    with sqlite3.connect(database_path) as conn:
+        conn.executescript("""
+            INSERT INTO user VALUES (3, 'other', 'x', 0, 0);
+            INSERT INTO car VALUES (2, 'Yaris', 1);
+            INSERT INTO service VALUES (1, 1, 'a', '2024-01-01', 30, 1);
+            INSERT INTO service VALUES (2, 3, 'b', '2024-01-01', 12, 1);
+            INSERT INTO service VALUES (3, NULL, 'c', '2024-01-01', 5, 1);
+            INSERT INTO service VALUES (4, 1, 'd', '2024-01-02', 7, 2);
+            """)
+
+    async def reports(db):
+        return {group: await revenue_report(db, group) for group in ("day", "car")}
+
+    run_db(rebuild_revenue)
+    before = run_db(reports)
+    assert before == {
+        "day": [
+            {"key": date(2024, 1, 1), "revenue": 47, "services": 3},
+            {"key": date(2024, 1, 2), "revenue": 7, "services": 1},
+        ],
+        "car": [
+            {"key": 1, "revenue": 47, "services": 3},
+            {"key": 2, "revenue": 7, "services": 1},
+        ],
+    }
+
+    async def delete_mechanics(db):
+        for user_id in (1, 3):
+            await delete_user(db, await get_user_by_id(db, user_id))
+
+    run_db(delete_mechanics)
+
+    assert run_db(reports) == before
+    assert run_db(lambda db: revenue_report(db, "mechanic")) == [
+        {"key": None, "revenue": 54, "services": 4}
+    ]
+
+    # car 1 now has three buckets without a mechanic on the first day, they
+    # are merged into one by the next change to them
+    assert [row[:3] for row in rollup(database_path)].count(
+        ("2024-01-01", None, 1)
+    ) == 3
+
+    async def delete(db):
+        await delete_service(db, await get_service(db, 2))
+
+    run_db(delete)
+
+    assert rollup(database_path) == [
+        ("2024-01-01", None, 1, 35, 2),
+        ("2024-01-02", None, 2, 7, 1),
+    ]
+
+
+def test_emptied_buckets_are_dropped(database_path, run_db):
+    async def create(db):
+        data = ServiceCreate(customer="a", car=1, date=date(2024, 1, 1))
+        return (await create_service(db, 1, data)).id
+
+    first, second = run_db(create), run_db(create)
+    assert rollup(database_path) == [("2024-01-01", 1, 1, 0, 2)]
+
+    async def move(db):
+        data = ServiceUpdate(customer="a", car=1, date=date(2024, 1, 2))
+        await update_service(db, await get_service(db, first), data)
+
+    run_db(move)
+    assert rollup(database_path) == [
+        ("2024-01-01", 1, 1, 0, 1),
+        ("2024-01-02", 1, 1, 0, 1),
+    ]
+
+    async def delete(db):
+        await delete_service(db, await get_service(db, second))
+        return await revenue_report(db, "day")
+
+    assert run_db(delete) == [{"key": date(2024, 1, 2), "revenue": 0, "services": 1}]
+    assert rollup(database_path) == [("2024-01-02", 1, 1, 0, 1)]
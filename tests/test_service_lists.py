@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+from crud.admin import get_services
+from crud.services import get_user_services
+
+SERVICES = 40
+ITEMS_PER_SERVICE = 3
+
+
+@pytest.fixture
+def count_statements(database_path, run_db, statements):
+    with sqlite3.connect(database_path) as conn:
+        conn.executemany(
+            "INSERT INTO service VALUES (?, 1, ?, ?, 30, 1)",
+            [
+                (i, f"cust{i}", f"2024-01-{i % 28 + 1:02}")
+                for i in range(1, SERVICES + 1)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO service_item (title, price, service) VALUES ('oil', 10, ?)",
+            [(i,) for i in range(1, SERVICES + 1) for _ in range(ITEMS_PER_SERVICE)],
+        )
+
+    def count_statements(list_services) -> tuple[int, int]:
+        statements.clear()
+        services, _ = run_db(list_services)
+        assert all(len(service["items"]) == ITEMS_PER_SERVICE for service in services)
+        return len(services), len(statements)
+
+    return count_statements
+
+
+@pytest.mark.parametrize(
+    "list_services",
+    [
+        lambda limit: lambda db: get_user_services(db, 1, limit=limit),
+        lambda limit: lambda db: get_services(db, limit=limit),
+    ],
+    ids=["mechanic", "admin"],
+)
+def test_query_count_does_not_grow_with_the_page(count_statements, list_services):
+    counts = {size: count_statements(list_services(size)) for size in (1, 10, SERVICES)}
+
+    assert {size: services for size, (services, _) in counts.items()} == {
+        1: 1,
+        10: 10,
+        SERVICES: SERVICES,
+    }
+    # one query for the page and one for all of its items
+    assert {statements for _, statements in counts.values()} == {2}
@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta, timezone
+import base64
+from datetime import date, datetime, timedelta, timezone
 
 from jose import jwt
 
@@ -13,3 +14,35 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+def user_claims(user) -> dict:
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "adm": user.is_admin,
+        "ver": user.token_version,
+    }
+
+
+def encode_cursor(cursor_date: date, cursor_id: int) -> str:
+    raw = f"{cursor_date.isoformat()}|{cursor_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        cursor_date, cursor_id = raw.split("|")
+        return date.fromisoformat(cursor_date), int(cursor_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+
+def parse_fields(fields: str, allowed: list[str]) -> list[str]:
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",")))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"unknown fields {unknown}, choose from {allowed}")
+
+    return names